@@ -0,0 +1,202 @@
+import cv2
+import time
+import threading
+from collections import deque
+
+
+class frameGrabber():
+    """
+    A class that reads frames from a capture device on its own thread and keeps only the newest ones in a small drop-oldest ring buffer, so the consumer always works on the freshest frame.
+
+    With pooling, frames are read into a fixed set of reused arrays, one per ring slot plus the one being read and the one held by the consumer. A frame returned by readFrame is then only valid until the next call, copy it to keep it longer.
+
+    In lossless mode nothing is dropped: the capture thread waits while the ring is full and the consumer gets every frame in order, for replaying recordings as fast as they can be processed.
+
+    Args:
+        cap (cv2.VideoCapture): An opened capture device, or a source from SourceModule.openSource, to read frames from.
+        bufferSize (int, optional): The number of frames kept in the ring buffer. Defaults to 2.
+        pooled (bool, optional): Whether to read frames into reused arrays instead of a new array per frame. Defaults to True.
+        lossless (bool, optional): Whether to hand out every frame in order instead of only the newest. Defaults to False.
+
+    Attributes:
+        cap (cv2.VideoCapture): The capture device frames are read from.
+        bufferSize (int): The number of frames kept in the ring buffer.
+        frames (deque): The ring buffer of (seq, timestamp, img) tuples, oldest first.
+        seq (int): The sequence number of the last captured frame.
+        lastSeq (int): The sequence number of the last frame handed to the consumer.
+        captured (int): The number of frames read from the capture device.
+        dropped (int): The number of captured frames that were overwritten or skipped before being read.
+        skipped (int): The number of device frames left undecoded to hold the setRate limit, not counted in dropped.
+        minInterval (float): The minimum number of seconds between kept frames, 0 to keep every frame.
+        allocated (int): The number of frame arrays the capture device had to allocate, flat once the pool is warm.
+        ended (bool): Whether the capture device closed, at the end of a file source, so no frames will follow the buffered ones.
+
+    """
+    def __init__(self, cap, bufferSize=2, pooled=True, lossless=False):
+        self.cap = cap
+        self.bufferSize = bufferSize
+        self.pooled = pooled
+        self.lossless = lossless
+        self.ended = False
+        self.frames = deque(maxlen=bufferSize)
+        self.seq = 0
+        self.lastSeq = 0
+        self.captured = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.minInterval = 0.0
+        self.allocated = 0
+        self._lastKept = 0.0
+        self._free = deque()
+        self._held = None
+        self._cond = threading.Condition()
+        self._run_flag = False
+        self._thread = None
+
+    def start(self):
+        """Starts the capture thread and returns the grabber"""
+        self._run_flag = True
+        self._thread = threading.Thread(target=self._run, name="frameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        buf = None
+        while self._run_flag:
+            if buf is None and self._free:
+                buf = self._free.popleft()
+            if self.minInterval:
+                # grab keeps the driver queue fresh, only kept frames pay for decoding
+                success = self.cap.grab()
+                timestamp = time.perf_counter()
+                if success and timestamp - self._lastKept < self.minInterval:
+                    self.skipped += 1
+                    continue
+                if success:
+                    success, img = self.cap.retrieve(buf) if buf is not None else self.cap.retrieve()
+            else:
+                success, img = self.cap.read(buf) if buf is not None else self.cap.read()
+                timestamp = time.perf_counter()
+            if not success:
+                if not self.cap.isOpened():
+                    # end of a file source, or the device went away
+                    break
+                # camera hiccup, give the driver a moment instead of spinning
+                time.sleep(0.005)
+                continue
+            if img is not buf:
+                self.allocated += 1
+            buf = None
+            with self._cond:
+                if self.lossless:
+                    # wait for the consumer instead of dropping
+                    self._cond.wait_for(lambda: len(self.frames) < self.bufferSize or not self._run_flag)
+                    if not self._run_flag:
+                        break
+                if len(self.frames) == self.bufferSize:
+                    self.dropped += 1
+                    self._recycle(self.frames.popleft()[2])
+                self.seq += 1
+                self.captured += 1
+                self._lastKept = timestamp
+                self.frames.append((self.seq, timestamp, img))
+                self._cond.notify_all()
+        with self._cond:
+            self.ended = True
+            self._cond.notify_all()
+
+    def readFrame(self, timeout=1.0):
+        """
+        Waits for a frame newer than the last one read and returns it. Older frames still in the buffer are discarded, or returned first in lossless mode.
+
+        Args:
+            timeout (float, optional): The number of seconds to wait for a new frame. Defaults to 1.0.
+
+        Returns:
+            tuple: A tuple containing the success flag, the frame sequence number, the capture timestamp (time.perf_counter) and the frame. On timeout the flag is False and the frame is None.
+
+        """
+        with self._cond:
+            if not self.frames:
+                self._cond.wait_for(lambda: self.frames or self.ended or not self._run_flag, timeout)
+            if not self.frames:
+                return False, self.lastSeq, None, None
+            if self.lossless:
+                seq, timestamp, img = self.frames.popleft()
+                self._cond.notify_all()
+            else:
+                seq, timestamp, img = self.frames.pop()
+                self.dropped += len(self.frames)
+                for old in self.frames:
+                    self._recycle(old[2])
+                self.frames.clear()
+            # the frame handed out last time is free once the consumer asks for the next one
+            self._recycle(self._held)
+            self._held = img
+            self.lastSeq = seq
+        return True, seq, timestamp, img
+
+    def _recycle(self, img):
+        if self.pooled and img is not None:
+            self._free.append(img)
+
+    def read(self):
+        """Drop-in replacement for cv2.VideoCapture.read returning the freshest frame"""
+        success, seq, timestamp, img = self.readFrame()
+        return success, img
+
+    def setRate(self, fps):
+        """Limits the rate frames are kept at, None or 0 keeps every frame the device delivers. Frames left out are counted in skipped, not dropped"""
+        self.minInterval = 1.0 / fps if fps else 0.0
+
+    def set(self, propId, value):
+        """Forwards a property to the capture device"""
+        return self.cap.set(propId, value)
+
+    def get(self, propId):
+        """Reads a property from the capture device"""
+        return self.cap.get(propId)
+
+    def behind(self):
+        """Returns how many frames the consumer is behind the capture thread, the frames captured while the last one was processed"""
+        return self.seq - self.lastSeq
+
+    def stop(self):
+        """Sets run flag to False and waits for the capture thread to finish"""
+        with self._cond:
+            self._run_flag = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def release(self):
+        """Stops the capture thread and releases the capture device"""
+        self.stop()
+        self.cap.release()
+
+
+def main():
+    pTime = 0
+    cap = cv2.VideoCapture(0)
+    grabber = frameGrabber(cap).start()
+    while True:
+        success, seq, timestamp, img = grabber.readFrame()
+        if not success:
+            continue
+        # simulate a slow consumer so the drop counter moves
+        time.sleep(0.05)
+        cTime = time.perf_counter()
+        fps = 1 / (cTime - pTime)
+        pTime = cTime
+        cv2.putText(img, f"{int(fps)} fps  seq {seq}  dropped {grabber.dropped}", (10, 30), cv2.FONT_HERSHEY_PLAIN, 1.5,
+                    (255, 0, 255), 2)
+        cv2.imshow("Image", img)
+        esc = cv2.waitKey(1) & 0xff #  if pressed esc
+        if esc == 27:
+            break
+    grabber.release()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
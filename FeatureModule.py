@@ -0,0 +1,158 @@
+import numpy as np
+import time
+
+# indices of the hands in the landmark arrays
+LEFT, RIGHT = 0, 1
+# landmark indices of the thumb and finger tips
+TIP_IDS = np.array([4, 8, 12, 16, 20])
+# (p1, p2) landmark pairs whose distance is measured relative to the wrist to p1 distance
+PINCH_PAIRS = np.array([(4, 8), (8, 12), (12, 16), (16, 20)])
+# value of each finger in the 5-bit mask, thumb is bit 0
+FINGER_BITS = (1 << np.arange(5)).astype(np.uint8)
+
+
+def fingerMasks(lm, present=None):
+    """Computes the (..., 2) uint8 5-bit finger masks of (..., 2, 21, 3) landmarks, 0 for missing hands"""
+    x, y = lm[..., 0], lm[..., 1]
+    up = np.empty(lm.shape[:-2] + (5,), bool)
+    # thumb points away from the palm along x, mirrored between hands
+    up[..., 0, 0] = x[..., 0, 4] < x[..., 0, 3]
+    up[..., 1, 0] = x[..., 1, 4] > x[..., 1, 3]
+    # fingers are up when the tip is above the pip joint
+    up[..., 1:] = y[..., TIP_IDS[1:]] < y[..., TIP_IDS[1:] - 2]
+    masks = up.astype(np.uint8) @ FINGER_BITS
+    if present is not None:
+        masks[~present] = 0
+    return masks
+
+
+def pinchRatios(lm, present=None, pairs=PINCH_PAIRS):
+    """Computes the (..., 2, P) float32 p1 to p2 over wrist to p1 distance ratios of (..., 2, 21, 3) landmarks, nan for missing hands"""
+    pairs = np.asarray(pairs)
+    xy = lm[..., :2]
+    p1 = xy[..., pairs[:, 0], :]
+    p2 = xy[..., pairs[:, 1], :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.linalg.norm(p2 - p1, axis=-1) / np.linalg.norm(p1 - xy[..., :1, :], axis=-1)
+    if present is not None:
+        ratios[~present] = np.nan
+    return ratios
+
+
+def handDistance(lm, present=None):
+    """Computes the (...) float32 distance between the index-middle midpoints of both hands of (..., 2, 21, 3) landmarks, nan when a hand is missing"""
+    xy = lm[..., :2]
+    mid = (xy[..., 8, :] + xy[..., 12, :]) * 0.5
+    distance = np.linalg.norm(mid[..., RIGHT, :] - mid[..., LEFT, :], axis=-1)
+    if present is not None:
+        distance = np.where(present.all(axis=-1), distance, np.float32(np.nan))
+    return distance
+
+
+def computeFeatures(lm, present=None, pairs=PINCH_PAIRS):
+    """
+    Computes the finger masks, pinch ratios and inter-hand distance of one frame or a stack of frames in a single NumPy pass.
+
+    Args:
+        lm (ndarray): The landmarks in pixels, shaped (2, 21, 3) for one frame or (N, 2, 21, 3) for a stack, hands indexed left then right.
+        present (ndarray, optional): The (2,) or (N, 2) bool flags telling which hands are present. Defaults to all present.
+        pairs (ndarray, optional): The (P, 2) landmark pairs to compute ratios for. Defaults to PINCH_PAIRS.
+
+    Returns:
+        tuple: A tuple containing the (..., 2) uint8 finger masks, the (..., 2, P) float32 pinch ratios (distance p1 to p2 over wrist to p1) and the (...) float32 distance between the index-middle midpoints of both hands. Values of missing hands are 0 for masks and nan otherwise.
+
+    """
+    lm = np.asarray(lm, np.float32)
+    if present is not None:
+        present = np.asarray(present, bool).reshape(lm.shape[:-2])
+    return fingerMasks(lm, present), pinchRatios(lm, present, pairs), handDistance(lm, present)
+
+
+class featureStore():
+    """
+    A class that holds the derived features of one frame, keyed by its sequence number. Each feature is computed on its first request and memoized until the landmarks of the next frame arrive, so features nobody asks for cost nothing.
+
+    Attributes:
+        seq (int): The sequence number of the frame the landmarks belong to.
+        computed (dict): The number of times each feature was computed.
+        requests (dict): The number of times each feature was asked for.
+
+    """
+    def __init__(self):
+        self.seq = None
+        self.computed = {}
+        self.requests = {}
+        self._lm = None
+        self._present = None
+        self._values = {}
+        self._pairIndex = {tuple(pair): i for i, pair in enumerate(PINCH_PAIRS.tolist())}
+
+    def reset(self, lm, present, seq):
+        """Sets the landmarks of a new frame and forgets the features of the last one"""
+        self._lm = lm
+        self._present = present
+        self.seq = seq
+        self._values.clear()
+
+    def _get(self, name, compute):
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if name not in self._values:
+            self.computed[name] = self.computed.get(name, 0) + 1
+            self._values[name] = compute()
+        return self._values[name]
+
+    def masks(self):
+        """Returns the (2,) uint8 finger masks of the frame"""
+        return self._get('masks', lambda: fingerMasks(self._lm, self._present))
+
+    def ratios(self):
+        """Returns the (2, 4) pinch ratios of PINCH_PAIRS of the frame"""
+        return self._get('ratios', lambda: pinchRatios(self._lm, self._present))
+
+    def distance(self):
+        """Returns the distance between the hands of the frame, nan if a hand is missing"""
+        return self._get('distance', lambda: handDistance(self._lm, self._present))
+
+    def ratio(self, p1, p2, side):
+        """Returns the p1 to p2 over wrist to p1 ratio of one hand, read from ratios() for PINCH_PAIRS"""
+        pair = self._pairIndex.get((p1, p2))
+        if pair is not None:
+            return float(self.ratios()[side, pair])
+        ratios = self._get(('ratio', p1, p2), lambda: pinchRatios(self._lm, self._present, [(p1, p2)])[:, 0])
+        return float(ratios[side])
+
+    def report(self):
+        """Returns how often each feature was computed and asked for as a printable line"""
+        return ", ".join(f"{name if isinstance(name, str) else '%s %d-%d' % name} computed {count} of {self.requests[name]}" for name, count in self.computed.items())
+
+
+def maskToList(mask):
+    """Expands a 5-bit finger mask into the [thumb, index, middle, ring, pinky] list used by fingersUp"""
+    mask = int(mask)
+    return [mask & 1, (mask >> 1) & 1, (mask >> 2) & 1, (mask >> 3) & 1, (mask >> 4) & 1]
+
+
+def listToMask(fingers):
+    """Packs a [thumb, index, middle, ring, pinky] list into a 5-bit finger mask"""
+    mask = 0
+    for bit, up in enumerate(fingers):
+        if up:
+            mask |= 1 << bit
+    return mask
+
+
+def main():
+    # benchmark the kernel on a synthetic stack of frames
+    n = 10000
+    rng = np.random.default_rng(0)
+    lm = (rng.random((n, 2, 21, 3)) * (640, 480, 640)).astype(np.float32)
+    present = rng.random((n, 2)) > 0.1
+    computeFeatures(lm[:10], present[:10])
+    start = time.perf_counter()
+    masks, ratios, handDistance = computeFeatures(lm, present)
+    elapsed = time.perf_counter() - start
+    print(f"{n} frames in {elapsed * 1000:.1f} ms ({n / elapsed:.0f} frames/s)")
+    print("first frame:", maskToList(masks[0, 0]), maskToList(masks[0, 1]), ratios[0, 0], handDistance[0])
+
+if __name__ == "__main__":
+    main()
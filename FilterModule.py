@@ -0,0 +1,362 @@
+import numpy as np
+import math
+import sys
+import time
+from collections import deque
+
+
+class landmarkKalman():
+    """
+    A constant-velocity Kalman filter run independently on every coordinate of both hands' landmarks, vectorized over the whole (2, 21, 3) array.
+
+    Args:
+        processNoise (float, optional): The acceleration noise density, in normalized units per second squared. Defaults to 50.0.
+        measurementNoise (float, optional): The variance of a detected landmark coordinate, in normalized units squared. Defaults to 1e-5.
+
+    Attributes:
+        position (ndarray): The (2, 21, 3) estimated landmark positions.
+        velocity (ndarray): The (2, 21, 3) estimated landmark velocities, per second.
+        tracking (ndarray): The (2,) flags telling which hands have been initialized by a measurement.
+
+    """
+    def __init__(self, processNoise=50.0, measurementNoise=1e-5):
+        self.processNoise = processNoise
+        self.measurementNoise = measurementNoise
+        self.position = np.zeros((2, 21, 3), np.float32)
+        self.velocity = np.zeros((2, 21, 3), np.float32)
+        # covariance of (position, velocity) per coordinate, stored as its three distinct terms
+        self._p00 = np.zeros((2, 21, 3), np.float32)
+        self._p01 = np.zeros((2, 21, 3), np.float32)
+        self._p11 = np.zeros((2, 21, 3), np.float32)
+        self.tracking = np.zeros(2, bool)
+
+    def predict(self, dt):
+        """Moves the estimate dt seconds forward and returns the predicted positions"""
+        q = self.processNoise
+        self.position += self.velocity * dt
+        self._p00 += dt * (2 * self._p01 + dt * self._p11) + q * dt ** 3 / 3
+        self._p01 += dt * self._p11 + q * dt ** 2 / 2
+        self._p11 += q * dt
+        return self.position
+
+    def update(self, measured, present):
+        """
+        Corrects the estimate with detected landmarks. Hands seen for the first time start at the measurement with no velocity, missing hands stop being tracked.
+
+        Args:
+            measured (ndarray): The (2, 21, 3) detected landmarks.
+            present (ndarray): The (2,) flags telling which hands were detected.
+
+        """
+        fresh = present & ~self.tracking
+        s = self._p00 + self.measurementNoise
+        k0 = self._p00 / s
+        k1 = self._p01 / s
+        residual = measured - self.position
+        mask = present[:, None, None]
+        self.position += np.where(mask, k0 * residual, 0)
+        self.velocity += np.where(mask, k1 * residual, 0)
+        p01 = self._p01.copy()
+        self._p11 -= np.where(mask, k1 * p01, 0)
+        self._p01 -= np.where(mask, k0 * p01, 0)
+        self._p00 -= np.where(mask, k0 * self._p00, 0)
+        for side in np.flatnonzero(fresh):
+            self.position[side] = measured[side]
+            self.velocity[side] = 0
+            self._p00[side] = self.measurementNoise
+            self._p01[side] = 0
+            self._p11[side] = 1.0
+        self.tracking[:] = present
+
+
+class oneEuroFilter():
+    """
+    A One Euro filter for 2D positions: a low-pass filter whose cutoff rises with speed, so a still hand has no jitter and a fast one has little lag. Driven by timestamps, so its behaviour does not depend on the frame rate.
+
+    Args:
+        minCutoff (float, optional): The cutoff frequency at rest, in Hz. Lower removes more jitter. Defaults to 1.0.
+        beta (float, optional): How fast the cutoff rises with speed, in Hz per pixel per second. Higher removes more lag. Defaults to 0.007.
+        dCutoff (float, optional): The cutoff frequency used to smooth the speed, in Hz. Defaults to 1.0.
+
+    """
+    def __init__(self, minCutoff=1.0, beta=0.007, dCutoff=1.0):
+        self.minCutoff = minCutoff
+        self.beta = beta
+        self.dCutoff = dCutoff
+        self.reset()
+
+    def reset(self):
+        self._x = self._y = None
+        self._dx = self._dy = 0.0
+        self._t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def filter(self, x, y, t):
+        """Returns the filtered position of a sample taken at time t in seconds"""
+        if self._t is None or t <= self._t:
+            if self._t is None:
+                self._x, self._y, self._t = x, y, t
+            return self._x, self._y
+        dt = t - self._t
+        self._t = t
+        a = self._alpha(self.dCutoff, dt)
+        self._dx += a * ((x - self._x) / dt - self._dx)
+        self._dy += a * ((y - self._y) / dt - self._dy)
+        cutoff = self.minCutoff + self.beta * math.hypot(self._dx, self._dy)
+        a = self._alpha(cutoff, dt)
+        self._x += a * (x - self._x)
+        self._y += a * (y - self._y)
+        return self._x, self._y
+
+
+class emaFilter():
+    """
+    An exponential moving average for 2D positions with a time constant instead of a per-frame factor, so the smoothing is the same at any frame rate.
+
+    Args:
+        timeConstant (float, optional): The time in seconds the output takes to cover 63% of a step. Defaults to 0.08.
+
+    """
+    def __init__(self, timeConstant=0.08):
+        self.timeConstant = timeConstant
+        self.reset()
+
+    def reset(self):
+        self._x = self._y = None
+        self._t = None
+
+    def filter(self, x, y, t):
+        """Returns the filtered position of a sample taken at time t in seconds"""
+        if self._t is None:
+            self._x, self._y, self._t = x, y, t
+            return x, y
+        dt = max(t - self._t, 0.0)
+        self._t = t
+        a = 1.0 - math.exp(-dt / self.timeConstant)
+        self._x += a * (x - self._x)
+        self._y += a * (y - self._y)
+        return self._x, self._y
+
+
+class passThrough():
+    """A filter that returns its input, for benchmarking the unfiltered cursor"""
+    def reset(self):
+        pass
+
+    def filter(self, x, y, t):
+        return x, y
+
+
+class cursorPredictor():
+    """
+    A class that extrapolates the cursor forward by the pipeline latency from a short velocity and acceleration history, so the cursor keeps up with the hand. Every prediction is later checked against where the cursor really went, to report how much error it removes.
+
+    Args:
+        history (int, optional): The number of recent samples the motion is fitted on. Defaults to 4.
+        acceleration (bool, optional): Whether to fit acceleration as well as velocity. Defaults to True.
+        maxLead (float, optional): The longest time in seconds to extrapolate over. Defaults to 0.1.
+        maxDistance (float, optional): The furthest the prediction may move from the current position, in pixels, to avoid overshoot. Defaults to 150.
+        maxGap (float, optional): The time in seconds without samples after which the history is dropped. Defaults to 0.2.
+
+    Attributes:
+        predictedError (float): The mean distance between predictions and where the cursor went.
+        heldError (float): The mean distance between unpredicted positions and where the cursor went.
+
+    """
+    def __init__(self, history=4, acceleration=True, maxLead=0.1, maxDistance=150.0, maxGap=0.2):
+        self.history = history
+        self.degree = 2 if acceleration else 1
+        self.maxLead = maxLead
+        self.maxDistance = maxDistance
+        self.maxGap = maxGap
+        self._t = deque(maxlen=history)
+        self._xy = deque(maxlen=history)
+        self._pending = deque()
+        self._errors = [0.0, 0.0, 0]
+
+    @property
+    def predictedError(self):
+        return self._errors[0] / max(self._errors[2], 1)
+
+    @property
+    def heldError(self):
+        return self._errors[1] / max(self._errors[2], 1)
+
+    def errorReduction(self):
+        """Returns the fraction of the unpredicted error the predictions removed"""
+        return 1.0 - self.predictedError / self.heldError if self.heldError else 0.0
+
+    def predict(self, x, y, t, latency):
+        """
+        Adds a sample and predicts where the cursor will be once the latency has passed.
+
+        Args:
+            x (float): The current x position.
+            y (float): The current y position.
+            t (float): The capture time of the sample in seconds.
+            latency (float): The seconds between capture and the cursor move.
+
+        Returns:
+            tuple: The predicted x and y position.
+
+        """
+        if self._t and t - self._t[-1] > self.maxGap:
+            self._t.clear()
+            self._xy.clear()
+            self._pending.clear()
+        self._score(x, y, t)
+        self._t.append(t)
+        self._xy.append((x, y))
+        if len(self._t) <= self.degree:
+            return x, y
+        lead = min(max(latency, 0.0), self.maxLead)
+        times = np.array(self._t) - t
+        coefs = np.polyfit(times, np.array(self._xy), self.degree)
+        # derivative terms of the fit at the newest sample, the constant term is replaced by the sample itself
+        dx, dy = coefs[-2] * lead
+        if self.degree == 2:
+            dx, dy = dx + coefs[0][0] * lead ** 2, dy + coefs[0][1] * lead ** 2
+        distance = math.hypot(dx, dy)
+        if distance > self.maxDistance:
+            dx, dy = dx * self.maxDistance / distance, dy * self.maxDistance / distance
+        px, py = x + dx, y + dy
+        self._pending.append((t + lead, px, py, x, y))
+        return px, py
+
+    def _score(self, x, y, t):
+        # compare the predictions aimed at or before this sample with where the cursor is now
+        while self._pending and self._pending[0][0] <= t:
+            target, px, py, hx, hy = self._pending.popleft()
+            self._errors[0] += math.hypot(px - x, py - y)
+            self._errors[1] += math.hypot(hx - x, hy - y)
+            self._errors[2] += 1
+
+
+# cursor filters by name, for the entry points' cursorFilter setting
+CURSOR_FILTERS = {'oneeuro': oneEuroFilter, 'ema': emaFilter, 'none': passThrough}
+
+
+def syntheticTrajectory(fps=30, seed=0):
+    """
+    Builds a cursor trajectory of rests and fast minimum-jerk reaches with hand tremor and detection noise.
+
+    Args:
+        fps (float, optional): The sample rate in Hz. Defaults to 30.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        tuple: A tuple containing the (n,) sample times, the (n, 2) true positions and the (n, 2) noisy positions, in screen pixels.
+
+    """
+    rng = np.random.default_rng(seed)
+    points = [np.array([960.0, 540.0])]
+    truth = []
+    for i in range(12):
+        target = rng.uniform((100, 100), (1820, 980))
+        rest, reach = int(fps * rng.uniform(0.5, 1.0)), int(fps * rng.uniform(0.2, 0.5))
+        truth += [points[-1]] * rest
+        s = np.linspace(0, 1, reach)[:, None]
+        truth += list(points[-1] + (target - points[-1]) * (10 * s ** 3 - 15 * s ** 4 + 6 * s ** 5))
+        points.append(target)
+    truth = np.array(truth)
+    t = np.arange(len(truth)) / fps
+    noisy = truth + rng.normal(0, 3.0, truth.shape)
+    return t, truth, noisy
+
+
+def loadTrajectory(path):
+    """
+    Loads a recorded t, x, y CSV trajectory. There is no ground truth for a recording, so a centred moving average of the samples stands in for it.
+
+    Args:
+        path (str): The CSV file with one t, x, y sample per line and an optional header.
+
+    Returns:
+        tuple: A tuple containing the (n,) sample times, the (n, 2) reference positions and the (n, 2) recorded positions.
+
+    """
+    data = np.genfromtxt(path, delimiter=',', names=None, invalid_raise=False)
+    data = data[~np.isnan(data).any(axis=1)]
+    t, samples = data[:, 0], data[:, 1:3]
+    kernel = np.ones(5) / 5
+    reference = np.column_stack([np.convolve(np.pad(samples[:, i], 2, mode='edge'), kernel, 'valid') for i in range(2)])
+    return t, reference, samples
+
+
+def lagAndJitter(cursorFilter, t, truth, samples):
+    """
+    Measures how far a filter trails the true position while it moves and how much it shakes while it rests.
+
+    Args:
+        cursorFilter (object): The filter to measure, reset before use.
+        t (ndarray): The (n,) sample times.
+        truth (ndarray): The (n, 2) true positions.
+        samples (ndarray): The (n, 2) noisy positions fed to the filter.
+
+    Returns:
+        tuple: A tuple containing the mean error while moving and the mean frame-to-frame shake while resting, in pixels.
+
+    """
+    cursorFilter.reset()
+    out = np.array([cursorFilter.filter(x, y, ti) for ti, (x, y) in zip(t, samples)])
+    speed = np.r_[0, np.linalg.norm(np.diff(truth, axis=0), axis=1)]
+    moving = speed > 1.0
+    lag = np.linalg.norm(out - truth, axis=1)[moving].mean()
+    # second differences ignore the smooth tail of a lagging filter settling, only shake is left
+    shake = np.r_[0, np.linalg.norm(np.diff(out, 2, axis=0), axis=1), 0]
+    jitter = shake[~moving][1:].mean()
+    return lag, jitter
+
+
+def benchmarkKalman():
+    # track a synthetic circular hand motion detected every third frame
+    kalman = landmarkKalman()
+    rng = np.random.default_rng(0)
+    base = rng.random((2, 21, 3)).astype(np.float32) * 0.2 + 0.4
+    present = np.array([True, True])
+    dt = 1 / 60
+    errors = []
+    n = 6000
+    start = time.perf_counter()
+    for i in range(n):
+        t = i * dt
+        truth = base + np.float32(0.1) * np.array([np.cos(2 * t), np.sin(2 * t), 0], np.float32)
+        kalman.predict(dt)
+        if i % 3 == 0:
+            measured = truth + rng.normal(0, 0.002, truth.shape).astype(np.float32)
+            kalman.update(measured, present)
+        elif i > 60:
+            errors.append(np.abs(kalman.position - truth)[..., :2].mean())
+    elapsed = time.perf_counter() - start
+    print(f"{n} frames in {elapsed * 1000:.1f} ms, mean predicted error {np.mean(errors):.4f} (normalized)")
+
+def benchmarkPredictor():
+    # error removed by predicting the filtered cursor 50 ms ahead
+    t, truth, samples = syntheticTrajectory(30)
+    smoother = oneEuroFilter()
+    predictor = cursorPredictor()
+    for ti, (x, y) in zip(t, samples):
+        predictor.predict(*smoother.filter(x, y, ti), ti, 0.05)
+    print(f"prediction error {predictor.predictedError:.1f} px vs {predictor.heldError:.1f} px held ({100 * predictor.errorReduction():.0f}% removed)")
+
+
+def main():
+    benchmarkKalman()
+    benchmarkPredictor()
+    # lag and jitter of each cursor filter, on recordings given as arguments or a synthetic trajectory
+    trajectories = [(path, loadTrajectory(path)) for path in sys.argv[1:]] or [("synthetic 30 fps", syntheticTrajectory(30)), ("synthetic 60 fps", syntheticTrajectory(60))]
+    for name, (t, truth, samples) in trajectories:
+        print(name)
+        for filterName, filterClass in CURSOR_FILTERS.items():
+            lag, jitter = lagAndJitter(filterClass(), t, truth, samples)
+            print(f"  {filterName:8s} lag {lag:6.1f} px  jitter {jitter:5.2f} px")
+        # the old fixed per-frame smoothening = 7
+        lag, jitter = lagAndJitter(emaFilter(-(1 / (len(t) / t[-1])) / math.log(1 - 1 / 7)), t, truth, samples)
+        print(f"  {'fixed 7':8s} lag {lag:6.1f} px  jitter {jitter:5.2f} px")
+
+if __name__ == "__main__":
+    main()
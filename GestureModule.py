@@ -0,0 +1,198 @@
+import numpy as np
+import random
+import time
+
+# actions resolved from the left and right finger masks
+NONE, MOVE, MOVE_LEFT, MOVE_RIGHT, MOVE_MIDDLE, SCROLL, SCROLL_UP, SCROLL_DOWN, RELEASE = range(9)
+
+# mouse buttons driven by the click gestures
+BUTTONS = ('left', 'right', 'middle')
+ACTION_BUTTON = {MOVE_LEFT: 'left', MOVE_RIGHT: 'right', MOVE_MIDDLE: 'middle'}
+MOVING = frozenset((MOVE, MOVE_LEFT, MOVE_RIGHT, MOVE_MIDDLE))
+
+# HUD text of each action, mode on the first line and detail on the second
+ACTION_LABELS = {
+    NONE: (None, None),
+    MOVE: ("Moving", None),
+    MOVE_LEFT: ("Moving", "Left Click"),
+    MOVE_RIGHT: ("Moving", "Right Click"),
+    MOVE_MIDDLE: ("Moving", "Middle Click"),
+    SCROLL: ("Scrolling", None),
+    SCROLL_UP: ("Scrolling", "UP"),
+    SCROLL_DOWN: ("Scrolling", "DOWN"),
+    RELEASE: (None, None),
+}
+
+# (action, left hand, right hand) finger patterns from thumb to pinky, 'x' matches either state, first match wins
+GESTURES = [
+    (MOVE_LEFT, "11100", "x1000"),    # right index up moves, left thumb index and middle up clicks left
+    (MOVE_RIGHT, "01100", "x1000"),   # left index and middle up clicks right
+    (MOVE_MIDDLE, "11110", "x1000"),  # left thumb index middle and ring up clicks middle
+    (MOVE, "xxxxx", "x1000"),
+    (SCROLL_UP, "x1100", "x1100"),    # right index and middle up scrolls, left index and middle up scrolls up
+    (SCROLL_DOWN, "x0000", "x1100"),  # left fist scrolls down
+    (SCROLL, "xxxxx", "x1100"),
+    (RELEASE, "xxxxx", "01111"),      # right open palm without thumb releases every button
+]
+
+
+def patternMatches(pattern, mask):
+    """Returns whether a 5-bit finger mask matches a thumb-to-pinky pattern such as "x1000" """
+    for bit, state in enumerate(pattern):
+        if state != 'x' and ((mask >> bit) & 1) != int(state):
+            return False
+    return True
+
+
+def buildTable(gestures=GESTURES):
+    """
+    Precomputes the action of every left and right finger mask combination.
+
+    Args:
+        gestures (list, optional): The (action, left pattern, right pattern) rules, first match wins. Defaults to GESTURES.
+
+    Returns:
+        list: The 1024 actions indexed by maskL | maskR << 5.
+
+    """
+    table = [NONE] * 1024
+    for code in range(1024):
+        maskL, maskR = code & 31, code >> 5
+        for action, left, right in gestures:
+            if patternMatches(left, maskL) and patternMatches(right, maskR):
+                table[code] = action
+                break
+    return table
+
+
+class buttonState():
+    """
+    A press and release state machine of one mouse button driven by a pinch ratio, with hysteresis between the two thresholds.
+
+    Args:
+        pressRatio (float, optional): The ratio under which the button is pressed. Defaults to 0.15.
+        releaseRatio (float, optional): The ratio over which the button is released. Defaults to 0.25.
+
+    Attributes:
+        pressed (bool): Whether the button is currently held down.
+
+    """
+    def __init__(self, pressRatio=0.15, releaseRatio=0.25):
+        self.pressRatio = pressRatio
+        self.releaseRatio = releaseRatio
+        self.pressed = False
+
+    def update(self, ratio):
+        """Returns True when the button goes down, False when it goes up and None when nothing changes"""
+        if not self.pressed and ratio < self.pressRatio:
+            self.pressed = True
+            return True
+        if self.pressed and ratio > self.releaseRatio:
+            self.pressed = False
+            return False
+        return None
+
+
+class gestureEngine():
+    """
+    A class that resolves the active action from the left and right finger masks with a precomputed lookup table, and keeps one press state machine per mouse button.
+
+    Args:
+        gestures (list, optional): The (action, left pattern, right pattern) rules, first match wins. Defaults to GESTURES.
+        pressRatio (float, optional): The pinch ratio under which a button is pressed. Defaults to 0.15.
+        releaseRatio (float, optional): The pinch ratio over which a button is released. Defaults to 0.25.
+
+    Attributes:
+        table (list): The 1024 actions indexed by maskL | maskR << 5.
+        buttons (dict): The buttonState of each button name in BUTTONS.
+        action (int): The action resolved for the last frame.
+
+    """
+    def __init__(self, gestures=GESTURES, pressRatio=0.15, releaseRatio=0.25):
+        self.table = buildTable(gestures)
+        self._tableArray = np.array(self.table, np.uint8)
+        self.buttons = {name: buttonState(pressRatio, releaseRatio) for name in BUTTONS}
+        self.action = NONE
+
+    def resolve(self, maskL, maskR):
+        """Returns the action of a pair of finger masks"""
+        return self.table[int(maskL) | int(maskR) << 5]
+
+    def resolveBatch(self, masksL, masksR):
+        """Returns the actions of arrays of finger masks"""
+        masksL = np.asarray(masksL, np.uint16)
+        masksR = np.asarray(masksR, np.uint16)
+        return self._tableArray[masksL | masksR << 5]
+
+    def update(self, maskL, maskR, ratio):
+        """
+        Resolves the action of a frame and steps the button state machines.
+
+        Args:
+            maskL (int): The 5-bit finger mask of the left hand, a Python int or a numpy scalar such as the uint8 of FeatureModule.fingerMasks.
+            maskR (int): The 5-bit finger mask of the right hand.
+            ratio (float): The left hand index to middle pinch ratio, only read by the click actions.
+
+        Returns:
+            tuple: A tuple containing the action and a list of (button, down) events to inject, in order.
+
+        """
+        # widen first, the uint8 masks of fingerMasks would lose the right ring and pinky bits in the shift
+        action = self.table[int(maskL) | int(maskR) << 5]
+        self.action = action
+        button = ACTION_BUTTON.get(action)
+        if button is not None:
+            down = self.buttons[button].update(ratio)
+            if down is None:
+                return action, []
+            return action, [(button, down)]
+        if action == RELEASE:
+            return action, self.releaseAll()
+        return action, []
+
+    def releaseAll(self):
+        """Releases every pressed button and returns the (button, False) events"""
+        events = []
+        for name, state in self.buttons.items():
+            if state.pressed:
+                state.pressed = False
+                events.append((name, False))
+        return events
+
+
+def main():
+    # the masks come from the kernel as uint8, an open right palm without thumb must still release
+    import FeatureModule as ftm
+    engine = gestureEngine()
+    engine.buttons['left'].pressed = True
+    lm = np.zeros((2, 21, 3), np.float32)
+    # every right finger tip above its pip joint except the thumb, which stays folded toward the palm
+    lm[1, :, 0] = np.linspace(0.3, 0.7, 21)
+    lm[1, :, 1] = 0.8
+    lm[1, [8, 12, 16, 20], 1] = 0.2
+    lm[1, 4, 0] = 0.2
+    masks = ftm.fingerMasks(lm, np.array([False, True]))
+    action, events = engine.update(masks[0], masks[1], 1.0)
+    assert masks[1] == 30 and action == RELEASE and events == [('left', False)], (masks, action, events)
+    print("uint8 masks:", masks.tolist(), "resolve to RELEASE")
+
+    # benchmark the per-frame path and the batched lookup on synthetic masks
+    n = 1000000
+    engine = gestureEngine()
+    rng = random.Random(0)
+    codes = [(rng.randrange(32), rng.randrange(32), rng.random() * 0.4) for _ in range(n)]
+    update = engine.update
+    start = time.perf_counter()
+    for maskL, maskR, ratio in codes:
+        update(maskL, maskR, ratio)
+    elapsed = time.perf_counter() - start
+    print(f"update: {n} frames in {elapsed:.2f} s ({n / elapsed / 1e6:.2f} M frames/s)")
+
+    masks = np.random.default_rng(0).integers(0, 32, (2, n))
+    start = time.perf_counter()
+    engine.resolveBatch(masks[0], masks[1])
+    elapsed = time.perf_counter() - start
+    print(f"resolveBatch: {n} frames in {elapsed * 1000:.1f} ms ({n / elapsed / 1e6:.1f} M frames/s)")
+
+if __name__ == "__main__":
+    main()
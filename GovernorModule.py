@@ -0,0 +1,224 @@
+import time
+
+ACTIVE, IDLE = 'active', 'idle'
+
+
+class idleGovernor():
+    """
+    A class that drops capture and inference to a low rate and resolution after a run of frames without hands, and returns to full rate on the first frame a hand is detected again.
+
+    Capture resolution is left alone because reopening the camera at another size takes far longer than one detection cycle, the inference size is lowered instead. With a qualityController the controller keeps owning the scale: it is paused while idle and applies idleScale on top of its level.
+
+    Args:
+        detector (HandModule.handDetector): The detector whose inference scale is lowered while idle.
+        grabber (CaptureModule.frameGrabber, optional): The grabber whose frame rate is lowered while idle. Defaults to None.
+        idleAfter (int, optional): The number of consecutive frames without hands before going idle. Defaults to 90.
+        idleFps (float, optional): The frame rate kept while idle. Defaults to 5.
+        idleScale (float, optional): The inference scale used while idle, relative to the active one. Defaults to 0.5.
+        quality (qualityController, optional): The controller that sets the inference scale, paused while idle. Defaults to None.
+
+    Attributes:
+        state (str): ACTIVE or IDLE.
+        timeIn (dict): The seconds spent in each state.
+        transitions (int): The number of state changes.
+
+    """
+    def __init__(self, detector, grabber=None, idleAfter=90, idleFps=5, idleScale=0.5, quality=None):
+        self.detector = detector
+        self.grabber = grabber
+        self.quality = quality
+        self.idleAfter = idleAfter
+        self.idleFps = idleFps
+        self.idleScale = idleScale
+        self.state = ACTIVE
+        self.timeIn = {ACTIVE: 0.0, IDLE: 0.0}
+        self.transitions = 0
+        self._activeScale = detector.inferenceScale
+        self._framesWithoutHands = 0
+        self._lastTime = None
+
+    def update(self, handsFound, now=None):
+        """
+        Accounts one processed frame and switches state when needed.
+
+        Args:
+            handsFound (bool): Whether the frame had at least one hand.
+            now (float, optional): The time of the frame in seconds. Defaults to time.perf_counter().
+
+        Returns:
+            str: The state for the next frame.
+
+        """
+        if now is None:
+            now = time.perf_counter()
+        if self._lastTime is not None:
+            self.timeIn[self.state] += now - self._lastTime
+        self._lastTime = now
+        if handsFound:
+            self._framesWithoutHands = 0
+            if self.state == IDLE:
+                self._enter(ACTIVE)
+        else:
+            self._framesWithoutHands += 1
+            if self.state == ACTIVE and self._framesWithoutHands >= self.idleAfter:
+                self._enter(IDLE)
+        return self.state
+
+    def _enter(self, state):
+        self.state = state
+        self.transitions += 1
+        if state == IDLE:
+            if self.quality is not None:
+                # cheap idle frames would otherwise make the controller step up and undo the idle scale
+                self.quality.pause(self.idleScale)
+            else:
+                self._activeScale = self.detector.inferenceScale
+                self.detector.setInferenceScale(self._activeScale * self.idleScale)
+            if self.grabber is not None:
+                self.grabber.setRate(self.idleFps)
+        else:
+            if self.quality is not None:
+                self.quality.resume()
+            else:
+                self.detector.setInferenceScale(self._activeScale)
+            if self.grabber is not None:
+                self.grabber.setRate(None)
+
+    def report(self):
+        """Returns the time spent in each state, and the camera frames skipped at the idle rate, as a printable line"""
+        total = sum(self.timeIn.values()) or 1.0
+        line = ", ".join(f"{state} {seconds:.1f} s ({100 * seconds / total:.0f}%)" for state, seconds in self.timeIn.items())
+        if self.grabber is not None:
+            line += f", {self.grabber.skipped} frames skipped"
+        return line
+
+
+# quality levels from best to cheapest, as (modelComplexity, inferenceScale, keyframeInterval)
+QUALITY_LADDER = [
+    (1, 1.0, 1),
+    (0, 1.0, 1),
+    (0, 0.75, 1),
+    (0, 0.5, 1),
+    (0, 0.5, 2),
+    (0, 0.5, 3),
+]
+
+
+class qualityController():
+    """
+    A class that moves the detector down a quality ladder while frames take longer than the frame-time budget, and back up when there is headroom, with hysteresis so it does not oscillate.
+
+    The detector settings it is created with are the top level, the levels of the ladder that cost more in any respect are left out, so the controller never raises the cost of a configuration.
+
+    Every MediaPipe graph the ladder needs is built when the controller is created, so switching levels never builds one on the hot path.
+
+    Args:
+        detector (HandModule.handDetector): The detector to tune.
+        targetFps (float, optional): The frame rate whose frame time is the budget. Defaults to 30.
+        ladder (list, optional): The (modelComplexity, inferenceScale, keyframeInterval) levels from best to cheapest, below the configured settings. Defaults to QUALITY_LADDER.
+        downMargin (float, optional): The fraction over budget the average frame time must reach to step down. Defaults to 0.1.
+        upHeadroom (float, optional): The fraction of the budget the average frame time must stay under to step up. Defaults to 0.6.
+        patience (int, optional): The number of consecutive frames over budget before stepping down. Stepping up waits four times as long, doubled each time a step up had to be undone. Defaults to 15.
+        smoothing (float, optional): The weight of the newest frame in the running averages. Defaults to 0.1.
+
+    Attributes:
+        ladder (list): The levels used, the configured settings first.
+        level (int): The index of the current level in the ladder.
+        frameTime (float): The running average processing time of a frame in seconds.
+        stageTimes (dict): The running average time of each reported stage in seconds.
+        switches (int): The number of level changes.
+        paused (bool): Whether frames are ignored and the level held, such as while an idleGovernor is idle.
+
+    """
+    def __init__(self, detector, targetFps=30, ladder=QUALITY_LADDER, downMargin=0.1, upHeadroom=0.6, patience=15, smoothing=0.1):
+        self.detector = detector
+        self.budget = 1.0 / targetFps
+        current = (detector.modelComplex, detector.inferenceScale, detector.keyframeInterval)
+        complexity, scale, interval = current
+        self.ladder = [current] + [level for level in ladder if level != current
+                                   and level[0] <= complexity and level[1] <= scale and level[2] >= interval]
+        self.downMargin = downMargin
+        self.upHeadroom = upHeadroom
+        self.patience = patience
+        self.smoothing = smoothing
+        self.frameTime = None
+        self.stageTimes = {}
+        self.switches = 0
+        self._over = 0
+        self._under = 0
+        self._backoff = 0
+        self._lastStep = 0
+        self._scaleFactor = 1.0
+        self.paused = False
+        detector.prepareModels({level[0] for level in self.ladder})
+        self.level = 0
+
+    def update(self, frameTime, stages=None):
+        """
+        Accounts the processing time of one frame and changes level when the budget is missed or there is headroom.
+
+        Args:
+            frameTime (float): The seconds spent processing the frame, not counting the wait for the camera.
+            stages (dict, optional): The seconds spent in each named stage of the frame. Defaults to None.
+
+        Returns:
+            int: The level for the next frame.
+
+        """
+        if self.paused:
+            return self.level
+        a = self.smoothing
+        self.frameTime = frameTime if self.frameTime is None else self.frameTime + a * (frameTime - self.frameTime)
+        if stages:
+            for name, seconds in stages.items():
+                previous = self.stageTimes.get(name, seconds)
+                self.stageTimes[name] = previous + a * (seconds - previous)
+        if self.frameTime > self.budget * (1 + self.downMargin):
+            self._over += 1
+            self._under = 0
+            if self._over >= self.patience and self.level < len(self.ladder) - 1:
+                if self._lastStep < 0:
+                    # the level above could not hold the budget, wait longer before trying it again
+                    self._backoff = min(self._backoff + 1, 5)
+                self._step(1)
+        elif self.frameTime < self.budget * self.upHeadroom:
+            self._under += 1
+            self._over = 0
+            if self._under >= 4 * self.patience << self._backoff and self.level > 0:
+                self._step(-1)
+        else:
+            self._over = self._under = 0
+        return self.level
+
+    def _step(self, direction):
+        self.level += direction
+        self._lastStep = direction
+        self.switches += 1
+        self._apply()
+
+    def pause(self, scaleFactor=1.0):
+        """Holds the current level and ignores frames until resume, with the inference scale of the level multiplied by scaleFactor"""
+        self.paused = True
+        self._scaleFactor = scaleFactor
+        self._apply()
+
+    def resume(self):
+        """Goes back to the full inference scale of the current level and adapts to the frame times again"""
+        self.paused = False
+        self._scaleFactor = 1.0
+        self._apply()
+
+    def _apply(self):
+        complexity, scale, interval = self.ladder[self.level]
+        self.detector.setModelComplexity(complexity)
+        self.detector.setInferenceScale(scale * self._scaleFactor)
+        self.detector.setKeyframeInterval(interval)
+        self._over = self._under = 0
+        # let the averages settle on the new level before judging it
+        self.frameTime = None
+
+    def report(self):
+        """Returns the current level and average stage times as a printable line"""
+        complexity, scale, interval = self.ladder[self.level]
+        stages = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.stageTimes.items())
+        return f"level {self.level} (complexity {complexity}, scale {scale}, keyframe {interval}), {stages}"
@@ -1,7 +1,33 @@
 import cv2
 import mediapipe as mp
+import numpy as np
 import time
 import math
+import FeatureModule as ftm
+import FilterModule as flm
+
+# indices of the hands in the landmark arrays
+LEFT, RIGHT = ftm.LEFT, ftm.RIGHT
+
+
+def readLandmarks(results, lmNorm, present):
+    """
+    Copies the hands of a MediaPipe Hands result into landmark arrays.
+
+    Args:
+        results (NamedTuple): The result of mp.solutions.hands.Hands.process.
+        lmNorm (ndarray): The (2, 21, 3) array receiving the normalized landmarks, indexed by LEFT and RIGHT.
+        present (ndarray): The (2,) array receiving the hand flags.
+
+    """
+    present[:] = False
+    if results.multi_hand_landmarks:
+        for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
+            # the label is the same for all 21 points, look it up once per hand
+            side = LEFT if handedness.classification[0].label == 'Left' else RIGHT
+            lmNorm[side] = [(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+            present[side] = True
+
 
 class handDetector():
     """
@@ -13,6 +39,18 @@ class handDetector():
         modelComplexity (int, optional): The model complexity to use. Defaults to 1.
         detectionCon (float, optional): The confidence threshold for hand detection. Defaults to 0.5.
         trackCon (float, optional): The confidence threshold for hand tracking. Defaults to 0.5.
+        inferenceProcess (bool, optional): Whether to run MediaPipe in a separate process fed through shared memory, needs Python 3.8. Defaults to False.
+        pipelined (bool, optional): Whether the separate process returns the newest finished frame instead of the current one, trading one frame of latency for throughput. Defaults to False.
+        frameShape (tuple, optional): The height, width and channels of the frames, the size of the separate process buffers and of the conversion buffers. Defaults to (480, 640, 3).
+        roiTracking (bool, optional): Whether to run detection on a crop around the hands of the previous frame, falling back to the full frame when tracking is lost. Ignored with inferenceProcess, whose fixed frame buffers would stretch the crop. Defaults to False.
+        roiPad (float, optional): The padding added around each hand box before they are merged, as a fraction of its larger side. Defaults to 0.3.
+        roiRefresh (int, optional): The number of cropped frames after which a full frame is processed to pick up a new hand, while fewer than maxHands are tracked. Defaults to 15.
+        inferenceScale (float, optional): The factor frames are downscaled by before inference, landmarks stay in display geometry. Defaults to 1.0.
+        keyframeInterval (int, optional): Run the detector every this many frames and predict the landmarks in between with a Kalman filter, 1 detects every frame. Defaults to 1.
+        motionThreshold (float, optional): Run the detector before the next keyframe once the predicted landmarks moved this far since the last detection, in normalized units, None to only use keyframeInterval. Defaults to None.
+        motionGate (MotionModule.motionGate, optional): The gate deciding whether a frame moved enough to run detection on, static frames keep the previous landmarks. None runs every frame. Defaults to None.
+        mirror (bool, optional): Whether frames come unflipped from the camera and the landmarks are mirrored instead, x to 1 - x with the hands swapped, so the frame never needs flipping. Defaults to False.
+        profiler (ProfileModule.stageProfiler, optional): The profiler charged with the convert, inference and landmarks stages of detected frames. Defaults to None.
 
     Attributes:
         mode (bool): Whether the solution is running in real-time or not.
@@ -21,103 +59,402 @@ class handDetector():
         detectionCon (float): The confidence threshold for hand detection.
         trackCon (float): The confidence threshold for hand tracking.
         mpHands (mp.solutions.hands): A MediaPipe Hands solution.
-        hands (mp.solutions.hands.Hands): A MediaPipe Hands solution instance.
+        hands (mp.solutions.hands.Hands): A MediaPipe Hands solution instance, None when inference runs in a separate process.
+        worker (InferenceModule.inferenceWorker): The separate inference process, None when inference runs in this process.
         mpDraw (mp.solutions.drawing_utils): A MediaPipe Drawing solution.
         mpStyle (mp.solutions.drawing_styles): A MediaPipe Drawing styles solution.
         tipIds (list): The indices of the fingers and thumb tips in the HandLandmark list.
+        lmNorm (ndarray): The (2, 21, 3) float32 normalized x, y, z landmarks of the left and right hands.
+        lmPix (ndarray): The (2, 21, 3) float32 landmarks in pixels of the last processed frame, z scaled by the frame width.
+        handPresent (ndarray): The (2,) bool flags telling which of the left and right hands are present.
+        bbox (ndarray): The (2, 4) int32 xmin, ymin, xmax, ymax pixel boxes of the hands.
+        seq (int): The sequence number of the last frame given to findHands.
+        sourceSeq (int): The sequence number of the frame the landmarks were detected on, older than seq with pipelined inference.
+        sourceTime (float): The capture time of that frame in seconds.
+        features (FeatureModule.featureStore): The lazily computed features of the landmarks from the last call to findLandmarks.
+        fingerMasks (ndarray): The (2,) uint8 5-bit finger masks from the last call to findFeatures.
+        pinchRatios (ndarray): The (2, 4) pinch ratios of FeatureModule.PINCH_PAIRS from the last call to findFeatures.
+        handDistance (float): The distance between the hands from the last call to findFeatures.
+        inferenceScale (float): The factor frames are downscaled by before inference.
+        kalman (FilterModule.landmarkKalman): The filter predicting landmarks between detections, None when every frame is detected.
+        predicted (bool): Whether the landmarks of the last frame were predicted rather than detected.
+        motionGate (MotionModule.motionGate): The gate skipping detection on static frames, None when disabled.
+        keyframes (int): The number of frames the detector ran on.
+        predictedFrames (int): The number of frames whose landmarks were predicted.
+        roi (tuple): The x0, y0, x1, y1 pixel crop given to the detector for the last frame, None for the full frame.
+        roiFrames (int): The number of frames detected on a crop.
+        fullFrames (int): The number of frames detected on the full frame.
+        roiMisses (int): The number of crops that lost a hand and were detected again on the full frame.
 
     """
-    def __init__(self, mode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, trackCon=0.5):
+    def __init__(self, mode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, trackCon=0.5, inferenceProcess=False, pipelined=False, frameShape=(480, 640, 3), roiTracking=False, roiPad=0.3, roiRefresh=15, inferenceScale=1.0, keyframeInterval=1, motionThreshold=None, motionGate=None, mirror=False, profiler=None):
         self.mode = mode
         self.maxHands = maxHands
         self.modelComplex = modelComplexity
         self.detectionCon = detectionCon
         self.trackCon = trackCon
         self.mpHands = mp.solutions.hands
-        self.hands = self.mpHands.Hands(self.mode, self.maxHands,self.modelComplex, self.detectionCon, self.trackCon)
+        self.pipelined = pipelined
+        self.inferenceScale = inferenceScale
+        # flat buffers of the largest frame, crops and downscaled frames are contiguous views at their start
+        self._small = np.empty(int(np.prod(frameShape)), np.uint8)
+        self._rgb = np.empty(int(np.prod(frameShape)), np.uint8)
+        if inferenceProcess:
+            # only imported when used, shared memory needs Python 3.8
+            import InferenceModule as ifm
+            self.hands = None
+            # the shared buffers only need to hold the downscaled frames
+            frameShape = (max(int(frameShape[0] * inferenceScale), 1), max(int(frameShape[1] * inferenceScale), 1), 3)
+            self.worker = ifm.inferenceWorker(frameShape, 3, self.mode, self.maxHands, self.modelComplex, self.detectionCon, self.trackCon)
+        else:
+            self.hands = self.mpHands.Hands(self.mode, self.maxHands,self.modelComplex, self.detectionCon, self.trackCon)
+            self.worker = None
+        self._graphs = {self.modelComplex: self.hands}
+        # crops go through graphs of their own, the tracked hand rectangle a graph carries is normalized to its last input
+        self._cropGraphs = {}
         self.mpDraw = mp.solutions.drawing_utils
         self.mpStyle = mp.solutions.drawing_styles
+        # the default styles build new dicts on every call, build them once
+        self._landmarkStyle = self.mpStyle.get_default_hand_landmarks_style()
+        self._connectionStyle = self.mpStyle.get_default_hand_connections_style()
         self.tipIds = [4, 8, 12, 16, 20]
-
-    def findHands(self, img, draw=True):
+        self.lmNorm = np.zeros((2, 21, 3), np.float32)
+        self.lmPix = np.zeros((2, 21, 3), np.float32)
+        self.handPresent = np.zeros(2, bool)
+        self.bbox = np.zeros((2, 4), np.int32)
+        self._scale = np.ones(3, np.float32)
+        self.lmListL = []
+        self.lmListR = []
+        self.seq = 0
+        self.sourceSeq = 0
+        self.sourceTime = None
+        # capture times of the frames still in the separate process
+        self._frameTimes = {}
+        self.features = ftm.featureStore()
+        self.features.reset(self.lmPix, self.handPresent, self.seq)
+        self.roiTracking = roiTracking
+        if roiTracking:
+            self.prepareModels([self.modelComplex])
+        self.roiPad = roiPad
+        self.roiRefresh = roiRefresh
+        self.roi = None
+        self.roiFrames = 0
+        self.fullFrames = 0
+        self.roiMisses = 0
+        self._sinceFull = 0
+        self.results = None
+        self.keyframeInterval = keyframeInterval
+        self.motionThreshold = motionThreshold
+        self.kalman = flm.landmarkKalman() if keyframeInterval > 1 else None
+        self.predicted = False
+        self.keyframes = 0
+        self.predictedFrames = 0
+        self._sinceKeyframe = 0
+        self._lastTime = None
+        self._keyframeLm = np.zeros((2, 21, 3), np.float32)
+        self.motionGate = motionGate
+        self.mirror = mirror
+        self.profiler = profiler
+
+    def findHands(self, img, draw=True, timestamp=None, seq=None):
         """
         Detects hands in an image or video frame.
 
         Args:
             img (ndarray): The image or video frame to process.
             draw (bool, optional): Whether to draw the hand landmarks on the image or not. Defaults to True.
+            timestamp (float, optional): The capture time of the frame in seconds, used to predict landmarks between keyframes. Defaults to time.perf_counter().
+            seq (int, optional): The sequence number of the frame, the key of its features. Defaults to one more than the last frame.
 
         Returns:
             ndarray: The processed image or video frame.
 
         """
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)
-        if self.results.multi_hand_landmarks:
+        self.seq = self.seq + 1 if seq is None else seq
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        # predicted and gated frames stand for this frame, the worker path below may point at an older one
+        self.sourceSeq, self.sourceTime = self.seq, timestamp
+        if self.worker is not None:
+            self._frameTimes[self.seq] = timestamp
+        dt = 0.0 if self._lastTime is None else max(timestamp - self._lastTime, 0.0)
+        self._lastTime = timestamp
+        if self.motionGate is not None and not self.motionGate.check(img, self._handRegion()):
+            # nothing moved, keep the landmarks of the last frame
+            if self.kalman is not None:
+                self.kalman.velocity[:] = 0
+            if draw:
+                self.drawLandmarks(img)
+            return img
+        if self.kalman is not None:
+            self.kalman.predict(dt)
+            if not self._isKeyframe():
+                # keep the hands of the last detection, moved by their estimated velocity
+                self.lmNorm[:] = self.kalman.position
+                self.predicted = True
+                self.predictedFrames += 1
+                self._sinceKeyframe += 1
+                if draw:
+                    self.drawLandmarks(img)
+                return img
+        self.predicted = False
+        self.keyframes += 1
+        self._sinceKeyframe = 1
+        h, w = img.shape[:2]
+        roi = self._trackedRegion(w, h)
+        if roi is not None:
+            tracked = self.handPresent.sum()
+            x0, y0, x1, y1 = roi
+            self._detect(img[y0:y1, x0:x1], crop=True)
+            if self.handPresent.sum() < tracked:
+                # a hand left the crop, look for it in the whole frame
+                self.roiMisses += 1
+                roi = None
+            else:
+                # map the landmarks from the crop back to the full frame
+                self.lmNorm[..., 0] *= (x1 - x0) / w
+                self.lmNorm[..., 0] += x0 / w
+                self.lmNorm[..., 1] *= (y1 - y0) / h
+                self.lmNorm[..., 1] += y0 / h
+                self.lmNorm[..., 2] *= (x1 - x0) / w
+                self.roiFrames += 1
+                self._sinceFull += 1
+        if roi is None:
+            self._detect(img)
+            self.fullFrames += 1
+            self._sinceFull = 0
+        self.roi = roi
+        if self.mirror:
+            # as if the frame had been flipped, MediaPipe labels hands for a flipped frame
+            self.lmNorm[..., 0] = 1 - self.lmNorm[..., 0]
+            self.lmNorm[:] = self.lmNorm[::-1]
+            self.handPresent[:] = self.handPresent[::-1]
+        if self.kalman is not None:
+            self.kalman.update(self.lmNorm, self.handPresent)
+            self._keyframeLm[:] = self.lmNorm
+        if draw and (roi is not None or self.worker is not None):
+            self.drawLandmarks(img)
+        elif draw and self.results.multi_hand_landmarks:
             for handLms in self.results.multi_hand_landmarks:
-                self.mpDraw.draw_landmarks(img, handLms, self.mpHands.HAND_CONNECTIONS, self.mpStyle.get_default_hand_landmarks_style(), self.mpStyle.get_default_hand_connections_style())
+                self.mpDraw.draw_landmarks(img, handLms, self.mpHands.HAND_CONNECTIONS, self._landmarkStyle, self._connectionStyle)
         return img
 
+    def _handRegion(self):
+        # with every hand tracked only their surroundings matter, otherwise watch the whole frame for a new one
+        if self.handPresent.sum() < self.maxHands:
+            return None
+        return self._frameBox()
+
+    def _frameBox(self):
+        # normalized box around the present hands in the coordinates of the given frame, which differ when mirroring
+        xy = self.lmNorm[self.handPresent, :, :2]
+        x0, y0 = xy.min(axis=(0, 1))
+        x1, y1 = xy.max(axis=(0, 1))
+        if self.mirror:
+            x0, x1 = 1 - x1, 1 - x0
+        return x0, y0, x1, y1
+
+    def _handBoxes(self):
+        # (hands, 4) normalized x0, y0, x1, y1 box of each present hand, in the coordinates of the given frame
+        xy = self.lmNorm[self.handPresent, :, :2]
+        boxes = np.concatenate((xy.min(axis=1), xy.max(axis=1)), axis=1)
+        if self.mirror:
+            boxes[:, [0, 2]] = 1 - boxes[:, [2, 0]]
+        return boxes
+
+    def _isKeyframe(self):
+        # the detector runs every keyframeInterval frames, or earlier when the hands move fast
+        if self._sinceKeyframe >= self.keyframeInterval or not self.kalman.tracking.any():
+            return True
+        if self.motionThreshold is not None:
+            moved = np.abs(self.kalman.position - self._keyframeLm)[self.kalman.tracking, :, :2].max()
+            return moved > self.motionThreshold
+        return False
+
+    def _buffer(self, name, shape):
+        # contiguous view of shape at the start of a flat buffer, grown only when a larger frame arrives
+        size = shape[0] * shape[1] * shape[2]
+        flat = getattr(self, name)
+        if flat.size < size:
+            flat = np.empty(size, np.uint8)
+            setattr(self, name, flat)
+        return flat[:size].reshape(shape)
+
+    def _detect(self, img, crop=False):
+        # runs the detector on img and fills the arrays with landmarks normalized to it
+        if self.worker is not None:
+            # the worker resizes into its own shared buffers
+            done = self.worker.process(img, self.lmNorm, self.handPresent, seq=self.seq, pipelined=self.pipelined)
+            if done:
+                # pipelined landmarks belong to an earlier frame, trace them to it
+                self.sourceSeq, self.sourceTime = done, self._frameTimes.get(done, self.sourceTime)
+                for old in [key for key in self._frameTimes if key <= done]:
+                    del self._frameTimes[old]
+            if self.profiler is not None:
+                self.profiler.mark('inference')
+            return
+        if self.inferenceScale != 1.0:
+            h, w = img.shape[:2]
+            shape = (max(int(h * self.inferenceScale), 1), max(int(w * self.inferenceScale), 1), 3)
+            img = cv2.resize(img, (shape[1], shape[0]), dst=self._buffer('_small', shape), interpolation=cv2.INTER_AREA)
+        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self._buffer('_rgb', img.shape))
+        if self.profiler is not None:
+            self.profiler.mark('convert')
+        hands = self._cropGraphs[self.modelComplex] if crop else self.hands
+        self.results = hands.process(imgRGB)
+        if self.profiler is not None:
+            self.profiler.mark('inference')
+        readLandmarks(self.results, self.lmNorm, self.handPresent)
+
+    def setInferenceScale(self, scale):
+        """Changes the factor frames are downscaled by before inference, without rebuilding the MediaPipe graph. A separate inference process keeps the size it was started with."""
+        self.inferenceScale = scale
+
+    def prepareModels(self, complexities):
+        """
+        Builds a MediaPipe graph for each model complexity up front, and one for crops with ROI tracking, so setModelComplexity never builds one on the hot path.
+
+        Args:
+            complexities (iterable): The model complexities to prepare.
+
+        """
+        if self.worker is not None:
+            return
+        for complexity in complexities:
+            if complexity not in self._graphs:
+                self._graphs[complexity] = self.mpHands.Hands(self.mode, self.maxHands, complexity, self.detectionCon, self.trackCon)
+            if self.roiTracking and complexity not in self._cropGraphs:
+                self._cropGraphs[complexity] = self.mpHands.Hands(self.mode, self.maxHands, complexity, self.detectionCon, self.trackCon)
+
+    def setModelComplexity(self, complexity):
+        """Switches to the prepared graph of a model complexity. A separate inference process keeps the complexity it was started with."""
+        if self.worker is not None or complexity == self.modelComplex:
+            return
+        if complexity not in self._graphs or (self.roiTracking and complexity not in self._cropGraphs):
+            self.prepareModels([complexity])
+        self.hands = self._graphs[complexity]
+        self.modelComplex = complexity
+
+    def setKeyframeInterval(self, keyframeInterval):
+        """Changes how often the detector runs, predicting the landmarks in between when above 1"""
+        if keyframeInterval > 1 and self.kalman is None:
+            self.kalman = flm.landmarkKalman()
+        self.keyframeInterval = keyframeInterval
+
+    def _trackedRegion(self, w, h):
+        # union of the previous frame's hand boxes, each padded by its own size, None when the full frame should be used
+        if not self.roiTracking or self.worker is not None or not self.handPresent.any():
+            # the worker resizes every crop to its full-frame buffers, distorting the hand at the cost of a full frame,
+            # and pipelined results belong to an older frame, and so to an older crop
+            return None
+        if self._sinceFull >= self.roiRefresh and self.handPresent.sum() < self.maxHands:
+            return None
+        boxes = self._handBoxes() * (w, h, w, h)
+        # padding the union by its size would grow the crop with the distance between the hands
+        pad = self.roiPad * np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        if self.roi is not None:
+            # keep the crop while every hand stays half its pad inside, a moved crop misplaces the region the graph tracks
+            x0, y0, x1, y1 = self.roi
+            inset = pad / 2
+            if ((boxes[:, 0] - inset >= x0) & (boxes[:, 1] - inset >= y0) & (boxes[:, 2] + inset <= x1) & (boxes[:, 3] + inset <= y1)).all():
+                return self.roi
+        x0, y0 = max(int((boxes[:, 0] - pad).min()), 0), max(int((boxes[:, 1] - pad).min()), 0)
+        x1, y1 = min(int((boxes[:, 2] + pad).max()), w), min(int((boxes[:, 3] + pad).max()), h)
+        if x1 - x0 < 32 or y1 - y0 < 32 or (x1 - x0) * (y1 - y0) > 0.6 * w * h:
+            # too small to hold a hand or too big to be worth cropping
+            return None
+        return x0, y0, x1, y1
+
+    def drawLandmarks(self, img):
+        """
+        Draws the hand skeletons from the landmark arrays, for results that came without MediaPipe protobufs.
+
+        Args:
+            img (ndarray): The image or video frame to draw on.
+
+        """
+        h, w = img.shape[:2]
+        for side in np.flatnonzero(self.handPresent):
+            xy = self.lmNorm[side, :, :2]
+            if self.mirror:
+                xy = np.column_stack((1 - xy[:, 0], xy[:, 1]))
+            points = (xy * (w, h)).astype(np.int32).tolist()
+            for start, end in self.mpHands.HAND_CONNECTIONS:
+                cv2.line(img, points[start], points[end], (224, 224, 224), 2)
+            for cx, cy in points:
+                cv2.circle(img, (cx, cy), 4, (48, 48, 255), cv2.FILLED)
+
+    def close(self):
+        """Releases the MediaPipe graph or stops the separate inference process"""
+        if self.worker is not None:
+            self.worker.close()
+        for hands in list(self._graphs.values()) + list(self._cropGraphs.values()):
+            if hands is not None:
+                hands.close()
+
+    def findLandmarks(self, img, draw=False):
+        """
+        Scales the landmark arrays of the detected hands to pixels in one vectorized step.
+
+        Args:
+            img (ndarray): The image or video frame the hands were detected in.
+            draw (bool, optional): Whether to draw the landmark points on the image or not. Defaults to False.
+
+        Returns:
+            tuple: A tuple containing the (2, 21, 3) float32 pixel landmark array, indexed by LEFT and RIGHT, and the (2,) bool array telling which hands are present.
+
+        """
+        h, w = img.shape[:2]
+        self._scale[:] = w, h, w
+        np.multiply(self.lmNorm, self._scale, out=self.lmPix)
+        self.features.reset(self.lmPix, self.handPresent, self.seq)
+        for side in np.flatnonzero(self.handPresent):
+            xy = self.lmPix[side, :, :2]
+            self.bbox[side, :2] = xy.min(axis=0)
+            self.bbox[side, 2:] = xy.max(axis=0)
+            if draw:
+                for cx, cy in xy.astype(np.int32).tolist():
+                    cv2.circle(img, (cx, cy), 5, (255, 64, 35), cv2.FILLED)
+        return self.lmPix, self.handPresent
+
     def findPosition(self, img, draw=True):
         """
         Finds the position of the hands in an image or video frame.
 
+        The landmark lists are a compatibility view built from the arrays returned by findLandmarks.
+
         Args:
             img (ndarray): The image or video frame to process.
             draw (bool, optional): Whether to draw the hand landmarks on the image or not. Defaults to True.
 
         Returns:
-            tuple: A tuple containing the left hand landmarks and the right hand landmarks, as lists of tuples.
+            tuple: A tuple containing the left hand landmarks and the right hand landmarks, as lists of [id, cx, cy].
 
         """
-        xList = []
-        yList = []
-        # add up the z axis (far and near the camera)
-        # zList = []
-        # bbox = []
-        self.lmListL = []
-        self.lmListR = []
-        if self.results.multi_hand_landmarks:
-            for hand_no, hand_landmarks in enumerate(self.results.multi_hand_landmarks):
-                # print("hand index:", hand_no,"hand name from handedness:", self.results.multi_handedness[hand_no].classification[0].label, "hand index from handedness: ", self.results.multi_handedness[hand_no].classification[0].index)  # first hand of detection will be labelled as index 0
-                # for i in range(21):  # for loop i as a index for each landmark points
-                #     print(self.mpHands.HandLandmark(i).name, self.mpHands.HandLandmark(i).value) # from wrist to pinky_tip
-                #     print(f'{hand_landmarks.landmark[self.mpHands.HandLandmark(i).value]}')
-                # myHand = self.results.multi_hand_landmarks[0]
-                
-                for id, lm in enumerate(hand_landmarks.landmark):
-                    # print(self.results.multi_handedness[0].classification[0].label, "id is", id, lm)
-                    h, w, c = img.shape
-                    cx, cy = int(lm.x * w), int(lm.y * h)
-                    # add up the cz
-                    # cx, cy, cz = int(lm.x * w), int(lm.y * h), int(lm.z * -1)
-                    xList.append(cx)
-                    yList.append(cy)
-                    # zList.append(cz)
-                    
-                    # print(id, cx, cy)
-                    hand = self.results.multi_handedness[0].classification[0].index
-                    if (self.results.multi_handedness[hand_no].classification[0].label == 'Left'):
-                        self.lmListL.append([id, cx, cy])
-                        # self.lmListL.append([id, cx, cy,cz])
-                        # print("get left")
-                    if (self.results.multi_handedness[hand_no].classification[0].label == 'Right'):
-                        self.lmListR.append([id, cx, cy])
-                        # self.lmListR.append([id, cx, cy,cz])
-                        # print("get right")
-                    if draw:
-                        cv2.circle(img, (cx, cy), 5, (255, 64, 35), cv2.FILLED)
-
-                xmin, xmax = min(xList), max(xList)
-                ymin, ymax = min(yList), max(yList)
-                # add the zmin,zmax
-                # zmin,zmax = min(zList),max(zList)
-                bbox = xmin, ymin, xmax, ymax
-                # if draw:
-                #     cv2.rectangle(img, (xmin - 20, ymin - 20), (xmax + 20, ymax + 20), (0, 255, 0), 2)
-
+        self.findLandmarks(img, draw)
+        self.lmListL = self._landmarkList(LEFT)
+        self.lmListR = self._landmarkList(RIGHT)
         return self.lmListL, self.lmListR
 
+    def _landmarkList(self, side):
+        if not self.handPresent[side]:
+            return []
+        points = self.lmPix[side, :, :2].astype(np.int32).tolist()
+        return [[id, cx, cy] for id, (cx, cy) in enumerate(points)]
+
+    def findFeatures(self):
+        """
+        Returns every feature of the current frame, each computed at most once per frame by the feature store. Ask self.features for single features to skip computing the others.
+
+        Returns:
+            tuple: A tuple containing the (2,) uint8 finger masks, the (2, 4) pinch ratios of FeatureModule.PINCH_PAIRS and the distance between the hands (nan if a hand is missing).
+
+        """
+        self.fingerMasks = self.features.masks()
+        self.pinchRatios = self.features.ratios()
+        self.handDistance = self.features.distance()
+        return self.fingerMasks, self.pinchRatios, self.handDistance
+
     def fingersUp(self):
         """
         Determines whether the fingers of the hands are raised or not.
@@ -126,38 +463,8 @@ class handDetector():
             tuple: A tuple containing the left hand fingers and the right hand fingers, as lists of booleans.
 
         """
-        fingersL = []
-        fingersR = []
-        # thumb
-        if len(self.lmListL):
-            if self.lmListL[self.tipIds[0]][1] < self.lmListL[self.tipIds[0] - 1][1]:
-                fingersL.append(1)
-            else:
-                fingersL.append(0)
-            # Fingers
-            for id in range(1, 5):
-                if self.lmListL[self.tipIds[id]][2] < self.lmListL[self.tipIds[id] - 2][2]:
-                    fingersL.append(1)
-                else:
-                    fingersL.append(0)
-        else:
-            fingersL = [0, 0, 0, 0, 0]
-
-        # thumb
-        if len(self.lmListR):
-            if self.lmListR[self.tipIds[0]][1] > self.lmListR[self.tipIds[0] - 1][1]:
-                fingersR.append(1)
-            else:
-                fingersR.append(0)
-            # Fingers
-            for id in range(1, 5):
-                if self.lmListR[self.tipIds[id]][2] < self.lmListR[self.tipIds[id] - 2][2]:
-                    fingersR.append(1)
-                else:
-                    fingersR.append(0)
-        else:
-            fingersR = [0, 0, 0, 0, 0]
-        return fingersL, fingersR
+        masks = self.features.masks()
+        return ftm.maskToList(masks[LEFT]), ftm.maskToList(masks[RIGHT])
 
     def findDistance(self, p1, p2, img, draw=True, r=15, t=3, re=255, g=0, b=255):
         """
@@ -212,14 +519,10 @@ class handDetector():
         """
         x1, y1 = self.lmListL[p1][1:]
         x2, y2 = self.lmListL[p2][1:]
-        wx, wy = self.lmListL[0][1:]
         # print("x1, y1 = ",self.lmListL[p1][1:])
         cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-        # from wrist to p1
-        wristp1 = math.hypot (x1 - wx, y1 -wy)
-        # from p1 to p2
-        pp12 = math.hypot(x2 - x1, y2 - y1)
-        length = pp12/wristp1
+        # p1 to p2 over wrist to p1, memoized for the rest of the frame
+        length = self.features.ratio(p1, p2, LEFT)
         # if draw:
         # cv2.line(img, (x1, y1), (x2, y2), (re, g, b), t)
         # cv2.circle(img, (x1, y1), r, (255, 0, 255), cv2.FILLED)
@@ -249,6 +552,11 @@ class handDetector():
             tuple: A tuple containing the calculated distance between the two hands and the processed image or video frame. If both hands are not detected, None and the image are returned.
         """
 
+        if (p1_left, p2_left, p1_right, p2_right) == (8, 12, 8, 12):
+            # the default landmarks are covered by the feature store
+            distance = float(self.features.distance())
+            return (None if math.isnan(distance) else distance), img
+
         if self.lmListL and self.lmListR:  # Check if both hands are detected
             x1_left, y1_left = self.lmListL[p1_left][1:]
             x2_left, y2_left = self.lmListL[p2_left][1:]
@@ -301,7 +609,9 @@ def main():
         esc = cv2.waitKey(1) & 0xff #  if pressed esc
         if esc == 27:
             break
-cv2.destroyAllWindows()
+    cap.release()
+    detector.close()
+    cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
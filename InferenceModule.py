@@ -0,0 +1,208 @@
+import cv2
+import numpy as np
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+
+def _workerMain(frameName, resultName, shape, slots, params, requests, replies):
+    # runs in the child process, MediaPipe is only imported here
+    import mediapipe as mp
+    import HandModule as htm
+    frameShm = shared_memory.SharedMemory(name=frameName)
+    resultShm = shared_memory.SharedMemory(name=resultName)
+    frames, landmarks, present = _views(frameShm, resultShm, shape, slots)
+    hands = mp.solutions.hands.Hands(*params)
+    replies.put(None)  # ready
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            slot, seq = request
+            results = hands.process(frames[slot])
+            htm.readLandmarks(results, landmarks[slot], present[slot])
+            replies.put((slot, seq))
+    finally:
+        hands.close()
+        del frames, landmarks, present
+        frameShm.close()
+        resultShm.close()
+
+
+def _views(frameShm, resultShm, shape, slots):
+    frames = np.ndarray((slots,) + tuple(shape), np.uint8, buffer=frameShm.buf)
+    landmarks = np.ndarray((slots, 2, 21, 3), np.float32, buffer=resultShm.buf)
+    present = np.ndarray((slots, 2), bool, buffer=resultShm.buf, offset=landmarks.nbytes)
+    return frames, landmarks, present
+
+
+class inferenceWorker():
+    """
+    A class that runs MediaPipe Hands in a separate process. Frames go through a ring of preallocated shared-memory buffers and landmarks come back as arrays, so no frame is ever pickled.
+
+    Args:
+        shape (tuple, optional): The height, width and channels of the frame buffers. Defaults to (480, 640, 3).
+        slots (int, optional): The number of frame buffers in the ring. Defaults to 3.
+        mode (bool, optional): Whether to treat each frame as a static image or not. Defaults to False.
+        maxHands (int, optional): The maximum number of hands to detect. Defaults to 2.
+        modelComplexity (int, optional): The model complexity to use. Defaults to 1.
+        detectionCon (float, optional): The confidence threshold for hand detection. Defaults to 0.5.
+        trackCon (float, optional): The confidence threshold for hand tracking. Defaults to 0.5.
+        startTimeout (float, optional): The number of seconds to wait for the worker to build its graph. Defaults to 60.
+
+    Raises:
+        RuntimeError: If the worker exits or does not get ready within startTimeout, for example when MediaPipe cannot be imported in it.
+
+    Attributes:
+        shape (tuple): The shape of the frame buffers.
+        slots (int): The number of frame buffers in the ring.
+        frames (ndarray): The (slots, h, w, 3) RGB frame buffers in shared memory.
+        landmarks (ndarray): The (slots, 2, 21, 3) normalized landmarks written by the worker.
+        present (ndarray): The (slots, 2) hand flags written by the worker.
+        submitted (int): The number of frames sent to the worker.
+        completed (int): The number of frames the worker returned landmarks for.
+
+    """
+    def __init__(self, shape=(480, 640, 3), slots=3, mode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, trackCon=0.5, startTimeout=60.0):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frameSize = slots * int(np.prod(self.shape))
+        resultSize = slots * 2 * 21 * 3 * 4 + slots * 2
+        self._frameShm = shared_memory.SharedMemory(create=True, size=frameSize)
+        self._resultShm = shared_memory.SharedMemory(create=True, size=resultSize)
+        self.frames, self.landmarks, self.present = _views(self._frameShm, self._resultShm, self.shape, slots)
+        self._requests = multiprocessing.Queue()
+        self._replies = multiprocessing.Queue()
+        params = (mode, maxHands, modelComplexity, detectionCon, trackCon)
+        self.proc = multiprocessing.Process(target=_workerMain, name="inferenceWorker", daemon=True,
+                            args=(self._frameShm.name, self._resultShm.name, self.shape, slots, params, self._requests, self._replies))
+        self.proc.start()
+        self._resized = np.empty(self.shape, np.uint8)
+        self._inFlight = []
+        self._lastSlot = None
+        self._lastSeq = 0
+        self.submitted = 0
+        self.completed = 0
+        # wait for the graph to be built so the first frame does not pay for it
+        self._waitReady(startTimeout)
+
+    def _waitReady(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                self._replies.get(True, 0.5)
+                return
+            except queue.Empty:
+                pass
+            if not self.proc.is_alive():
+                exitcode = self.proc.exitcode
+                self.close()
+                raise RuntimeError(f"inference worker exited with code {exitcode} before it was ready, check that MediaPipe imports and runs in a child process")
+            if time.perf_counter() > deadline:
+                self.close()
+                raise RuntimeError(f"inference worker was not ready after {timeout:.0f} s")
+
+    def submit(self, img, seq):
+        """
+        Writes a BGR frame into a free buffer as RGB and queues it for inference.
+
+        Args:
+            img (ndarray): The BGR image or video frame to process.
+            seq (int): The sequence number of the frame, returned with its landmarks.
+
+        Raises:
+            RuntimeError: If every buffer is busy and the worker died or stopped answering.
+
+        """
+        if len(self._inFlight) >= self.slots - 1:
+            # every buffer is busy, wait for the oldest one rather than overwrite it
+            if not self._collect(block=True):
+                state = f"exited with code {self.proc.exitcode}" if not self.proc.is_alive() else "returned nothing for 5 s"
+                raise RuntimeError(f"inference worker {state} with every frame buffer busy")
+        busy = set(self._inFlight)
+        busy.add(self._lastSlot)
+        slot = next(s for s in range(self.slots) if s not in busy)
+        if img.shape[:2] != self.shape[:2]:
+            img = cv2.resize(img, (self.shape[1], self.shape[0]), dst=self._resized, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.frames[slot])
+        self._inFlight.append(slot)
+        self._requests.put((slot, seq))
+        self.submitted += 1
+
+    def _collect(self, block):
+        try:
+            slot, seq = self._replies.get(block, 5.0 if block else None)
+        except queue.Empty:
+            return False
+        self._inFlight.remove(slot)
+        if seq >= self._lastSeq:
+            self._lastSlot, self._lastSeq = slot, seq
+        self.completed += 1
+        return True
+
+    def process(self, img, lmNorm, present, seq=None, pipelined=False):
+        """
+        Runs inference on a frame and copies the landmarks into the caller's arrays.
+
+        Args:
+            img (ndarray): The BGR image or video frame to process.
+            lmNorm (ndarray): The (2, 21, 3) array receiving the normalized landmarks.
+            present (ndarray): The (2,) array receiving the hand flags.
+            seq (int, optional): The sequence number of the frame. Defaults to a running count.
+            pipelined (bool, optional): Whether to return the newest finished frame instead of waiting for this one. Defaults to False.
+
+        Returns:
+            int: The sequence number of the frame the landmarks belong to, 0 if none finished yet.
+
+        """
+        if seq is None:
+            seq = self.submitted + 1
+        self.submit(img, seq)
+        if pipelined:
+            while self._collect(block=False):
+                pass
+        else:
+            while self._lastSeq < seq and self._collect(block=True):
+                pass
+        if self._lastSlot is None:
+            present[:] = False
+            return 0
+        lmNorm[:] = self.landmarks[self._lastSlot]
+        present[:] = self.present[self._lastSlot]
+        return self._lastSeq
+
+    def close(self):
+        """Stops the worker process and frees the shared memory"""
+        if self.proc is None:
+            return
+        if self.proc.is_alive():
+            self._requests.put(None)
+            self.proc.join(5.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.proc = None
+        del self.frames, self.landmarks, self.present
+        self._frameShm.close()
+        self._frameShm.unlink()
+        self._resultShm.close()
+        self._resultShm.unlink()
+
+
+def main():
+    # time the round trip of blank frames through the worker
+    worker = inferenceWorker()
+    img = np.zeros((480, 640, 3), np.uint8)
+    lmNorm = np.zeros((2, 21, 3), np.float32)
+    present = np.zeros(2, bool)
+    n = 100
+    start = time.perf_counter()
+    for i in range(n):
+        worker.process(img, lmNorm, present)
+    elapsed = time.perf_counter() - start
+    print(f"{n} frames in {elapsed:.2f} s ({n / elapsed:.1f} fps)")
+    worker.close()
+
+if __name__ == "__main__":
+    main()
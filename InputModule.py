@@ -0,0 +1,478 @@
+import csv
+import math
+import numpy as np
+import threading
+import time
+from collections import deque
+import ScreenModule as scm
+
+# kinds of input events
+MOVE, PRESS, RELEASE, SCROLL = range(4)
+EVENT_NAMES = ('move', 'press', 'release', 'scroll')
+# fields of an inputSink trace record, times from time.perf_counter
+TRACE_FIELDS = ('kind', 'seq', 'captured', 'queued', 'injected')
+
+
+class pyautoguiBackend():
+    """
+    An input backend that moves the cursor with autopy and injects buttons and wheel clicks with pyautogui, without pyautogui's PAUSE sleep after each call.
+
+    Attributes:
+        size (tuple): The width and height of the main screen.
+        bounds (tuple): The x0, y0, x1, y1 box of the whole desktop across monitors.
+
+    """
+    def __init__(self):
+        # imported here so headless runs with the null backend need neither of them
+        import autopy
+        import pyautogui
+        self._autopy = autopy
+        self._pag = pyautogui
+        self.size = autopy.screen.size()
+        self.bounds = scm.desktopBounds(scm.listMonitors(self.size))
+
+    def screenSize(self):
+        return self.size
+
+    def setMonitors(self, monitors):
+        """Clamps moves to a new monitor layout"""
+        self.bounds = scm.desktopBounds(monitors)
+
+    def move(self, x, y):
+        # autopy rejects points on or past the right and bottom edges
+        x = min(max(x, self.bounds[0]), self.bounds[2] - 1)
+        y = min(max(y, self.bounds[1]), self.bounds[3] - 1)
+        if 0 <= x < self.size[0] and 0 <= y < self.size[1]:
+            self._autopy.mouse.move(x, y)
+        else:
+            # autopy only knows the main screen, other monitors go through pyautogui
+            self._pag.moveTo(int(x), int(y), _pause=False)
+
+    def press(self, button):
+        self._pag.mouseDown(button=button, _pause=False)
+
+    def release(self, button):
+        self._pag.mouseUp(button=button, _pause=False)
+
+    def scroll(self, clicks):
+        self._pag.scroll(clicks, _pause=False)
+
+
+class nullBackend():
+    """
+    An input backend that injects nothing and records every event, for headless runs and tests.
+
+    Args:
+        size (tuple, optional): The screen size to report. Defaults to (1920, 1080).
+
+    Attributes:
+        events (list): The (time.perf_counter, kind, value) tuples received, in order.
+
+    """
+    def __init__(self, size=(1920, 1080)):
+        self.size = size
+        self.events = []
+
+    def screenSize(self):
+        return self.size
+
+    def setMonitors(self, monitors):
+        pass
+
+    def move(self, x, y):
+        self.events.append((time.perf_counter(), MOVE, (x, y)))
+
+    def press(self, button):
+        self.events.append((time.perf_counter(), PRESS, button))
+
+    def release(self, button):
+        self.events.append((time.perf_counter(), RELEASE, button))
+
+    def scroll(self, clicks):
+        self.events.append((time.perf_counter(), SCROLL, clicks))
+
+
+class inputSink():
+    """
+    A class that injects input events on its own thread through a bounded queue, so the vision loop never waits on the OS. Consecutive moves are merged into the latest position, consecutive scrolls are summed, and button events are sent in order.
+
+    Events can name the camera frame they came from as a (seq, capture timestamp) tuple. Injected events that do are traced, so the age of the frame behind every cursor move and click is known.
+
+    Args:
+        backend (object, optional): The backend with move, press, release, scroll and screenSize methods. Defaults to a pyautoguiBackend.
+        maxsize (int, optional): The maximum number of queued events. Defaults to 64.
+        traceSize (int, optional): The number of most recent traced events kept. Defaults to 4096.
+
+    Attributes:
+        backend (object): The backend events are injected through.
+        sent (int): The number of events injected.
+        coalesced (int): The number of events merged into a newer one before being injected.
+        dropped (int): The number of moves dropped because the queue was full.
+        errors (int): The number of events the backend failed to inject.
+        lastError (Exception): The last exception raised by the backend.
+        trace (deque): The TRACE_FIELDS records of the most recent injected events that named their frame.
+
+    """
+    def __init__(self, backend=None, maxsize=64, traceSize=4096):
+        self.backend = backend if backend is not None else pyautoguiBackend()
+        self.maxsize = maxsize
+        self.queue = deque()
+        self.trace = deque(maxlen=traceSize)
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lastError = None
+        self._busy = False
+        self._cond = threading.Condition()
+        self._run_flag = False
+        self._thread = None
+
+    def start(self):
+        """Starts the injection thread and returns the sink"""
+        self._run_flag = True
+        self._thread = threading.Thread(target=self._run, name="inputSink", daemon=True)
+        self._thread.start()
+        return self
+
+    def screenSize(self):
+        return self.backend.screenSize()
+
+    def setMonitors(self, monitors):
+        """Passes a new monitor layout, as returned by ScreenModule.listMonitors, to the backend"""
+        self.backend.setMonitors(monitors)
+
+    def move(self, x, y, frame=None):
+        """Queues a cursor move, replacing a move that has not been sent yet"""
+        self._put((MOVE, (x, y), frame, time.perf_counter()))
+
+    def press(self, button, frame=None):
+        """Queues a button press"""
+        self._put((PRESS, button, frame, time.perf_counter()))
+
+    def release(self, button, frame=None):
+        """Queues a button release"""
+        self._put((RELEASE, button, frame, time.perf_counter()))
+
+    def scroll(self, clicks, frame=None):
+        """Queues wheel clicks, added to a scroll that has not been sent yet"""
+        self._put((SCROLL, clicks, frame, time.perf_counter()))
+
+    def _put(self, event):
+        kind = event[0]
+        with self._cond:
+            if self.queue and self.queue[-1][0] == kind and kind in (MOVE, SCROLL):
+                if kind == SCROLL:
+                    # the merged scroll is traced as coming from the newest frame
+                    event = (SCROLL, self.queue[-1][1] + event[1]) + event[2:]
+                self.queue[-1] = event
+                self.coalesced += 1
+                return
+            if len(self.queue) >= self.maxsize:
+                if kind == MOVE:
+                    self.dropped += 1
+                    return
+                # button and wheel events are never dropped, wait for room
+                self._cond.wait_for(lambda: len(self.queue) < self.maxsize or not self._run_flag)
+            self.queue.append(event)
+            self._cond.notify_all()
+
+    def _run(self):
+        handlers = {MOVE: lambda xy: self.backend.move(*xy), PRESS: self.backend.press,
+                    RELEASE: self.backend.release, SCROLL: self.backend.scroll}
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self.queue or not self._run_flag)
+                if not self.queue:
+                    break
+                kind, value, frame, queued = self.queue.popleft()
+                self._busy = True
+                self._cond.notify_all()
+            try:
+                handlers[kind](value)
+                self.sent += 1
+                if frame is not None:
+                    self.trace.append((kind, frame[0], frame[1], queued, time.perf_counter()))
+            except Exception as e:
+                # a failed event (failsafe corner, out of bounds) must not kill the thread
+                self.errors += 1
+                self.lastError = e
+
+    def flush(self, timeout=1.0):
+        """Waits until every queued event has been injected, returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.queue and not self._busy, timeout)
+
+    def latencies(self, kind=None):
+        """Returns the seconds from frame capture to injection of the traced events, of one kind or of all"""
+        return np.array([injected - captured for k, seq, captured, queued, injected in list(self.trace) if kind is None or k == kind])
+
+    def traceReport(self):
+        """Returns the capture-to-injection p50/p95/p99 of each traced event kind as a printable line, with the mean time the vision loop and the queue held the frame"""
+        trace = np.array([(k, captured, queued, injected) for k, seq, captured, queued, injected in list(self.trace)]).reshape(-1, 4)
+        lines = []
+        for kind, name in enumerate(EVENT_NAMES):
+            rows = trace[trace[:, 0] == kind]
+            if len(rows):
+                p50, p95, p99 = np.percentile(rows[:, 3] - rows[:, 1], (50, 95, 99)) * 1000
+                loop = (rows[:, 2] - rows[:, 1]).mean() * 1000
+                queued = (rows[:, 3] - rows[:, 2]).mean() * 1000
+                lines.append(f"{name} {p50:.1f}/{p95:.1f}/{p99:.1f} ms ({loop:.1f} loop, {queued:.1f} queued, {len(rows)} events)")
+        return ", ".join(lines)
+
+    def dumpTrace(self, path):
+        """Writes the trace records to a CSV file, with the capture-to-injection latency in milliseconds"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(TRACE_FIELDS + ('latency_ms',))
+            for kind, seq, captured, queued, injected in list(self.trace):
+                writer.writerow((EVENT_NAMES[kind], seq, f"{captured:.6f}", f"{queued:.6f}", f"{injected:.6f}", f"{(injected - captured) * 1000:.3f}"))
+
+    def stop(self):
+        """Injects the queued events, then sets run flag to False and waits for the thread to finish"""
+        self.flush()
+        with self._cond:
+            self._run_flag = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class cursorScheduler():
+    """
+    A class that moves the cursor on its own thread at a fixed rate, such as the display refresh rate, gliding between the targets the vision loop sets at camera rate. Nothing is sent while the cursor rests on its target.
+
+    Args:
+        sink (inputSink): The sink the moves are sent through.
+        rate (float, optional): The number of moves per second. Defaults to 144.
+        stillDistance (float, optional): The distance in pixels under which the cursor counts as resting. Defaults to 0.5.
+
+    Attributes:
+        interval (float): The running average time in seconds between targets, the time each glide takes.
+        emitted (int): The number of moves sent.
+
+    """
+    def __init__(self, sink, rate=144, stillDistance=0.5):
+        self.sink = sink
+        self.rate = rate
+        self.stillDistance = stillDistance
+        self.interval = 1 / 30
+        self.emitted = 0
+        self._start = None
+        self._target = None
+        self._targetTime = 0.0
+        self._frame = None
+        self._last = None
+        self._lock = threading.Lock()
+        self._run_flag = False
+        self._thread = None
+
+    def start(self):
+        """Starts the output thread and returns the scheduler"""
+        self._run_flag = True
+        self._thread = threading.Thread(target=self._run, name="cursorScheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def setTarget(self, x, y, now=None, frame=None):
+        """Sets the next position to glide to, starting from wherever the cursor is now, the moves toward it traced to frame"""
+        if now is None:
+            now = time.perf_counter()
+        with self._lock:
+            if self._target is None:
+                self._start = (x, y)
+            else:
+                self._start = self._position(now)
+                # glide over the time the next target is expected to take
+                self.interval += 0.2 * (min(now - self._targetTime, 0.1) - self.interval)
+            self._target = (x, y)
+            self._targetTime = now
+            self._frame = frame
+
+    def _position(self, now):
+        fraction = min((now - self._targetTime) / self.interval, 1.0) if self.interval > 0 else 1.0
+        (sx, sy), (tx, ty) = self._start, self._target
+        return sx + (tx - sx) * fraction, sy + (ty - sy) * fraction
+
+    def _run(self):
+        period = 1.0 / self.rate
+        nextTick = time.perf_counter()
+        while self._run_flag:
+            now = time.perf_counter()
+            with self._lock:
+                position = self._position(now) if self._target is not None else None
+                frame = self._frame
+            if position is not None and (self._last is None or math.hypot(position[0] - self._last[0], position[1] - self._last[1]) >= self.stillDistance):
+                self.sink.move(*position, frame=frame)
+                self._last = position
+                self.emitted += 1
+            nextTick += period
+            delay = nextTick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind, do not try to catch up with a burst of moves
+                nextTick = time.perf_counter()
+
+    def stop(self):
+        """Sets run flag to False and waits for the output thread to finish"""
+        self._run_flag = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class scrollEngine():
+    """
+    A class that turns the scroll gesture into a scroll velocity and sends the wheel clicks on its own thread at a fixed tick, so the scroll speed does not depend on the camera frame rate. Holding the gesture accelerates the scroll, and in proportional mode the hand height sets the speed and direction.
+
+    Args:
+        sink (inputSink): The sink the wheel clicks are sent through.
+        rate (float, optional): The number of ticks per second. Defaults to 60.
+        speed (float, optional): The wheel clicks per second when the gesture starts. Defaults to 900.
+        acceleration (float, optional): The fraction of the start speed added per second the gesture is held. Defaults to 1.0.
+        maxSpeed (float, optional): The highest wheel clicks per second, also the speed at full height in proportional mode. Defaults to 4000.
+        deadZone (float, optional): The height around the middle that does not scroll in proportional mode. Defaults to 0.15.
+        timeout (float, optional): The seconds without an update after which scrolling stops, so a stalled vision loop does not scroll on. Defaults to 0.25.
+
+    Attributes:
+        velocity (float): The current wheel clicks per second, positive scrolls up.
+        emitted (int): The number of wheel events sent.
+        clicks (int): The total number of wheel clicks sent.
+
+    """
+    def __init__(self, sink, rate=60, speed=900, acceleration=1.0, maxSpeed=4000, deadZone=0.15, timeout=0.25):
+        self.sink = sink
+        self.rate = rate
+        self.speed = speed
+        self.acceleration = acceleration
+        self.maxSpeed = maxSpeed
+        self.deadZone = deadZone
+        self.timeout = timeout
+        self.velocity = 0.0
+        self.emitted = 0
+        self.clicks = 0
+        self._direction = 0
+        self._since = 0.0
+        self._lastUpdate = 0.0
+        self._frame = None
+        self._run_flag = False
+        self._thread = None
+
+    def start(self):
+        """Starts the scroll thread and returns the engine"""
+        self._run_flag = True
+        self._thread = threading.Thread(target=self._run, name="scrollEngine", daemon=True)
+        self._thread.start()
+        return self
+
+    def update(self, direction=0, height=None, now=None, frame=None):
+        """
+        Sets the scroll velocity from the gesture of the current frame. Call it on every frame, with direction 0 when not scrolling.
+
+        Args:
+            direction (int, optional): 1 to scroll up, -1 to scroll down, 0 to stop. Defaults to 0.
+            height (float, optional): The hand height from -1 at the bottom to 1 at the top for proportional mode, None to use direction. Defaults to None.
+            now (float, optional): The time of the frame in seconds. Defaults to time.perf_counter().
+            frame (tuple, optional): The (seq, capture timestamp) the scrolls are traced to. Defaults to None.
+
+        """
+        if now is None:
+            now = time.perf_counter()
+        self._lastUpdate = now
+        self._frame = frame
+        if height is not None:
+            magnitude = (min(abs(height), 1.0) - self.deadZone) / (1 - self.deadZone)
+            # squared so small offsets give fine control and the top of the range scrolls fast
+            velocity = math.copysign(self.maxSpeed * magnitude ** 2, height) if magnitude > 0 else 0.0
+            direction = (velocity > 0) - (velocity < 0)
+        else:
+            if direction != self._direction:
+                self._since = now
+            velocity = direction * min(self.speed * (1 + self.acceleration * (now - self._since)), self.maxSpeed)
+        self._direction = direction
+        self.velocity = velocity
+
+    def _run(self):
+        period = 1.0 / self.rate
+        nextTick = last = time.perf_counter()
+        pending = 0.0
+        while self._run_flag:
+            now = time.perf_counter()
+            if now - self._lastUpdate > self.timeout:
+                self.velocity = 0.0
+            if self.velocity:
+                # carry the fraction over so slow speeds still add up to whole clicks
+                pending += self.velocity * (now - last)
+                clicks = int(pending)
+                if clicks:
+                    pending -= clicks
+                    self.sink.scroll(clicks, frame=self._frame)
+                    self.emitted += 1
+                    self.clicks += abs(clicks)
+            else:
+                pending = 0.0
+            last = now
+            nextTick += period
+            delay = nextTick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                nextTick = time.perf_counter()
+
+    def stop(self):
+        """Sets run flag to False and waits for the scroll thread to finish"""
+        self._run_flag = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    # feed a burst of moves and clicks through the null backend
+    backend = nullBackend()
+    sink = inputSink(backend).start()
+    start = time.perf_counter()
+    for i in range(10000):
+        sink.move(i % 1920, i % 1080)
+        if i % 1000 == 0:
+            sink.press('left')
+            sink.release('left')
+            sink.scroll(30)
+    queued = time.perf_counter() - start
+    sink.stop()
+    kinds = [EVENT_NAMES[kind] for t, kind, value in backend.events]
+    print(f"queued 10030 events in {queued * 1000:.1f} ms, sent {sink.sent}, coalesced {sink.coalesced}, dropped {sink.dropped}")
+    print("presses:", kinds.count('press'), "releases:", kinds.count('release'), "moves:", kinds.count('move'))
+
+    # targets at 30 Hz become moves at 144 Hz, then stop once the cursor rests
+    backend = nullBackend()
+    sink = inputSink(backend).start()
+    scheduler = cursorScheduler(sink, rate=144).start()
+    for i in range(30):
+        scheduler.setTarget(i * 10, i * 5, frame=(i, time.perf_counter()))
+        time.sleep(1 / 30)
+    time.sleep(0.5)
+    scheduler.stop()
+    sink.stop()
+    print(f"30 targets in 1 s became {scheduler.emitted} moves")
+    # the glide reaches each target one target interval after its frame
+    print("frame to move:", sink.traceReport())
+
+    # a scroll gesture held for one second on a 30 fps loop
+    backend = nullBackend()
+    sink = inputSink(backend).start()
+    scroller = scrollEngine(sink).start()
+    for i in range(30):
+        scroller.update(1)
+        time.sleep(1 / 30)
+    scroller.update(0)
+    scroller.stop()
+    sink.stop()
+    print(f"scrolled {scroller.clicks} clicks in {scroller.emitted} wheel events")
+
+if __name__ == "__main__":
+    main()
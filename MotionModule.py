@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+import time
+
+
+class motionGate():
+    """
+    A class that decides whether a frame changed enough since the last processed one to be worth running hand detection on, by differencing small grayscale copies.
+
+    Args:
+        size (tuple, optional): The width and height of the grayscale copy frames are compared on. Defaults to (80, 60).
+        pixelThreshold (int, optional): The grayscale difference at which a pixel counts as changed. Defaults to 12.
+        areaThreshold (float, optional): The fraction of changed pixels at which the frame counts as moving. Defaults to 0.005.
+        maxSkip (int, optional): The number of skipped frames after which a frame is processed anyway. Defaults to 30.
+        roiPad (float, optional): The padding added around the region of the last known hands, as a fraction of its larger side. Defaults to 0.5.
+
+    Attributes:
+        processed (int): The number of frames let through to detection.
+        skipped (int): The number of frames that reused the previous results.
+        score (float): The fraction of changed pixels of the last checked frame.
+
+    """
+    def __init__(self, size=(80, 60), pixelThreshold=12, areaThreshold=0.005, maxSkip=30, roiPad=0.5):
+        self.size = size
+        self.pixelThreshold = pixelThreshold
+        self.areaThreshold = areaThreshold
+        self.maxSkip = maxSkip
+        self.roiPad = roiPad
+        self.processed = 0
+        self.skipped = 0
+        self.score = 0.0
+        self._small = np.empty((size[1], size[0], 3), np.uint8)
+        self._gray = np.empty((size[1], size[0]), np.uint8)
+        self._diff = np.empty((size[1], size[0]), np.uint8)
+        self._reference = None
+        self._sinceProcessed = 0
+
+    def check(self, img, region=None):
+        """
+        Compares a frame with the last processed one.
+
+        Args:
+            img (ndarray): The BGR image or video frame.
+            region (tuple, optional): The normalized x0, y0, x1, y1 box of the last known hands to restrict the comparison to, None for the whole frame. Defaults to None.
+
+        Returns:
+            bool: True when the frame should be processed, False when the previous results can be reused.
+
+        """
+        cv2.resize(img, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        if self._reference is None or self._sinceProcessed >= self.maxSkip:
+            return self._accept()
+        cv2.absdiff(self._gray, self._reference, dst=self._diff)
+        diff = self._diff
+        if region is not None:
+            w, h = self.size
+            x0, y0, x1, y1 = region
+            pad = self.roiPad * max(x1 - x0, y1 - y0)
+            diff = diff[max(int((y0 - pad) * h), 0):min(int((y1 + pad) * h) + 1, h),
+                        max(int((x0 - pad) * w), 0):min(int((x1 + pad) * w) + 1, w)]
+        self.score = np.count_nonzero(diff > self.pixelThreshold) / max(diff.size, 1)
+        if self.score > self.areaThreshold:
+            return self._accept()
+        self.skipped += 1
+        self._sinceProcessed += 1
+        return False
+
+    def _accept(self):
+        # the reference only moves on processed frames, so slow drift still adds up to a detection
+        if self._reference is None:
+            self._reference = self._gray.copy()
+        else:
+            np.copyto(self._reference, self._gray)
+        self.processed += 1
+        self._sinceProcessed = 0
+        return True
+
+
+def main():
+    pTime = 0
+    cap = cv2.VideoCapture(0)
+    gate = motionGate()
+    while True:
+        success, img = cap.read()
+        if not success:
+            continue
+        moving = gate.check(img)
+        cTime = time.perf_counter()
+        fps = 1 / (cTime - pTime)
+        pTime = cTime
+        cv2.putText(img, f"{int(fps)} fps  {'moving' if moving else 'static'}  score {gate.score:.3f}  skipped {gate.skipped}",
+                    (10, 30), cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 0, 255), 2)
+        cv2.imshow("Image", img)
+        esc = cv2.waitKey(1) & 0xff #  if pressed esc
+        if esc == 27:
+            break
+    cap.release()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
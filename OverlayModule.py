@@ -0,0 +1,205 @@
+import cv2
+import numpy as np
+import threading
+import time
+
+# the 21-point hand skeleton, the same pairs as mp.solutions.hands.HAND_CONNECTIONS
+HAND_CONNECTIONS = [(0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8), (5, 9), (9, 10), (10, 11),
+                    (11, 12), (9, 13), (13, 14), (14, 15), (15, 16), (13, 17), (0, 17), (17, 18), (18, 19), (19, 20)]
+
+# HUD colors, BGR
+BLACK, GREEN, BLUE, RED = (0, 0, 0), (0, 252, 0), (255, 0, 0), (0, 0, 255)
+PRESS_COLOR, RELEASE_COLOR = (0, 255, 127), (200, 0, 100)
+
+
+class overlayRenderer():
+    """
+    A class that draws the hand skeletons and HUD onto a downscaled copy of the frame at a lower rate than the control loop. Styles are fixed when it is created and each HUD string is rendered once into a mask that is reused while the string stays the same.
+
+    Args:
+        size (tuple, optional): The width and height of the preview. Defaults to (320, 240).
+        rate (float, optional): The number of previews per second, None to render every frame. Defaults to 15.
+        flashTime (float, optional): The seconds the button indicator stays lit after a press or release, so previews that skip the frame of the event still show it. Defaults to 0.2.
+        maxGlyphs (int, optional): The number of HUD strings kept rendered before the cache is cleared. Defaults to 256.
+        mirror (bool, optional): Whether to flip the preview, for frames left unflipped because the detector mirrors the landmarks. Defaults to False.
+
+    Attributes:
+        rendered (int): The number of previews rendered.
+        skipped (int): The number of frames that were not due for a preview.
+
+    """
+    def __init__(self, size=(320, 240), rate=15, flashTime=0.2, maxGlyphs=256, mirror=False):
+        self.size = size
+        self.mirror = mirror
+        self.interval = 1.0 / rate if rate else 0.0
+        self.flashTime = flashTime
+        self.maxGlyphs = maxGlyphs
+        self.rendered = 0
+        self.skipped = 0
+        self.preview = np.zeros((size[1], size[0], 3), np.uint8)
+        self._scale = np.array(size, np.float32)
+        self._connections = np.array(HAND_CONNECTIONS)
+        self._glyphs = {}
+        self._lastRender = None
+        self._flash = None
+        self._flashUntil = 0.0
+
+    def due(self, now=None):
+        """Returns whether a preview is due, counting the frame as skipped when it is not"""
+        if now is None:
+            now = time.perf_counter()
+        if self._lastRender is None or now - self._lastRender >= self.interval:
+            return True
+        self.skipped += 1
+        return False
+
+    def flash(self, down, now=None):
+        """Lights the button indicator for a press when down is true, for a release otherwise"""
+        if now is None:
+            now = time.perf_counter()
+        self._flash = PRESS_COLOR if down else RELEASE_COLOR
+        self._flashUntil = now + self.flashTime
+
+    def _glyph(self, text):
+        mask = self._glyphs.get(text)
+        if mask is None:
+            if len(self._glyphs) >= self.maxGlyphs:
+                self._glyphs.clear()
+            (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, 1, 2)
+            canvas = np.zeros((h + baseline + 2, w + 2), np.uint8)
+            cv2.putText(canvas, text, (1, h + 1), cv2.FONT_HERSHEY_PLAIN, 1, 255, 2)
+            mask = self._glyphs[text] = (canvas > 0, h + 1)
+        return mask
+
+    def _blit(self, preview, text, org, color):
+        mask, top = self._glyph(text)
+        x, y = org[0] - 1, org[1] - top
+        h, w = mask.shape
+        pw, ph = self.size
+        # clip to the preview
+        x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, pw), min(y + h, ph)
+        if x0 >= x1 or y0 >= y1:
+            return
+        np.copyto(preview[y0:y1, x0:x1], np.uint8(color), where=mask[y0 - y:y1 - y, x0 - x:x1 - x, None])
+
+    def render(self, img, lmNorm=None, present=None, hud=(), now=None, out=None):
+        """
+        Renders a preview of the frame.
+
+        Args:
+            img (ndarray): The BGR frame to preview.
+            lmNorm (ndarray, optional): The (2, 21, 3) normalized landmarks to draw. Defaults to None.
+            present (ndarray, optional): The (2,) flags telling which hands to draw. Defaults to None.
+            hud (list, optional): The (text, (x, y), color) lines to write, positions in preview pixels. Defaults to ().
+            now (float, optional): The time of the preview in seconds. Defaults to time.perf_counter().
+            out (ndarray, optional): The buffer of the preview size to render into, such as previewChannel.buffer(). Defaults to a buffer reused by the next call.
+
+        Returns:
+            ndarray: The preview.
+
+        """
+        if now is None:
+            now = time.perf_counter()
+        self._lastRender = now
+        self.rendered += 1
+        preview = self.preview if out is None else out
+        cv2.resize(img, self.size, dst=preview, interpolation=cv2.INTER_LINEAR)
+        if self.mirror:
+            # flipping the preview is far cheaper than flipping the frame
+            cv2.flip(preview, 1, dst=preview)
+        if lmNorm is not None:
+            for side in np.flatnonzero(present):
+                points = (lmNorm[side, :, :2] * self._scale).astype(np.int32)
+                # one call for the whole skeleton
+                cv2.polylines(preview, list(points[self._connections]), False, (224, 224, 224), 1)
+                for cx, cy in points.tolist():
+                    cv2.circle(preview, (cx, cy), 2, (48, 48, 255), cv2.FILLED)
+        for text, org, color in hud:
+            self._blit(preview, text, org, color)
+        if self._flash is not None and now < self._flashUntil:
+            cv2.circle(preview, (25, 65), 10, self._flash, cv2.FILLED)
+        return preview
+
+
+class previewChannel():
+    """
+    A class that passes the latest preview from the vision thread to a GUI that pulls it on its own timer, through three reused buffers so neither side waits or copies. The vision thread renders into buffer() and calls publish(), the GUI calls take() and may read the returned buffer until its next take().
+
+    Args:
+        shape (tuple): The height, width and channels of the previews.
+
+    Attributes:
+        published (int): The number of previews published.
+        taken (int): The number of previews taken by the GUI.
+        dropped (int): The number of previews replaced by a newer one before the GUI took them.
+
+    """
+    def __init__(self, shape):
+        self.shape = shape
+        self.published = 0
+        self.taken = 0
+        self.dropped = 0
+        self._back, self._ready, self._front = (np.zeros(shape, np.uint8) for i in range(3))
+        self._fresh = False
+        self._lock = threading.Lock()
+
+    def buffer(self):
+        """Returns the buffer the next preview is rendered into, owned by the vision thread until publish"""
+        return self._back
+
+    def publish(self):
+        """Hands the rendered buffer to the GUI, replacing a preview it has not taken yet"""
+        with self._lock:
+            self._back, self._ready = self._ready, self._back
+            if self._fresh:
+                self.dropped += 1
+            self._fresh = True
+            self.published += 1
+
+    def take(self):
+        """Returns the newest preview not taken yet, or None when there is none"""
+        with self._lock:
+            if not self._fresh:
+                return None
+            self._front, self._ready = self._ready, self._front
+            self._fresh = False
+            self.taken += 1
+            return self._front
+
+    def report(self):
+        """Returns the preview counters as a printable line"""
+        return f"published {self.published}, shown {self.taken}, dropped {self.dropped}"
+
+
+def main():
+    # compare the renderer with drawing on the full frame and scaling it down
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (720, 1280, 3), np.uint8)
+    lmNorm = rng.random((2, 21, 3)).astype(np.float32)
+    present = np.array([True, True])
+    hud = [("30", (20, 50), BLACK), ("dropped 0", (20, 30), BLACK), ("Moving", (45, 50), GREEN), ("Left Click", (45, 70), BLUE)]
+    overlay = overlayRenderer((640, 360), rate=None)
+    n = 200
+    frame = img.copy()
+    start = time.perf_counter()
+    for i in range(n):
+        h, w = frame.shape[:2]
+        for side in range(2):
+            points = (lmNorm[side, :, :2] * (w, h)).astype(np.int32).tolist()
+            for a, b in HAND_CONNECTIONS:
+                cv2.line(frame, points[a], points[b], (224, 224, 224), 2)
+            for cx, cy in points:
+                cv2.circle(frame, (cx, cy), 4, (48, 48, 255), cv2.FILLED)
+        for text, org, color in hud:
+            cv2.putText(frame, text, org, cv2.FONT_HERSHEY_PLAIN, 1, color, 2)
+        cv2.resize(frame, (640, 360), interpolation=cv2.INTER_LINEAR)
+    full = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for i in range(n):
+        overlay.render(img, lmNorm, present, hud)
+    preview = (time.perf_counter() - start) / n
+    print(f"draw then scale {full * 1000:.2f} ms, overlayRenderer {preview * 1000:.2f} ms per frame")
+    print("at 15 previews/s on a 30 fps loop, half of the frames skip it entirely")
+
+if __name__ == "__main__":
+    main()
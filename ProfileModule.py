@@ -0,0 +1,128 @@
+import csv
+import json
+import numpy as np
+import time
+
+# the stages of one frame, in pipeline order
+STAGES = ('capture', 'convert', 'inference', 'landmarks', 'gesture', 'input', 'display')
+PERCENTILES = (50, 95, 99)
+
+
+class stageProfiler():
+    """
+    A class that records how long each stage of a frame takes, in a fixed-size ring of the most recent frames, and reports rolling percentiles from it.
+
+    Stages are timed by marks: each mark charges the time since the previous mark to its stage, so a stage marked more than once in a frame adds up.
+
+    Args:
+        stages (tuple, optional): The stage names. Defaults to STAGES.
+        window (int, optional): The number of most recent frames kept. Defaults to 1024.
+
+    Attributes:
+        frames (int): The number of frames recorded.
+        samples (ndarray): The (window, stages) ring of stage times in seconds.
+
+    """
+    def __init__(self, stages=STAGES, window=1024):
+        self.stages = tuple(stages)
+        self.window = window
+        self.frames = 0
+        self.samples = np.zeros((window, len(self.stages)))
+        self._index = {name: i for i, name in enumerate(self.stages)}
+        self._row = np.zeros(len(self.stages))
+        self._mark = None
+
+    def start(self, now=None):
+        """Starts timing a frame"""
+        self._row[:] = 0
+        self._mark = time.perf_counter() if now is None else now
+
+    def mark(self, stage):
+        """Charges the time since the previous mark to a stage"""
+        now = time.perf_counter()
+        self._row[self._index[stage]] += now - self._mark
+        self._mark = now
+
+    def end(self):
+        """Stores the stage times of the frame in the ring"""
+        self.samples[self.frames % self.window] = self._row
+        self.frames += 1
+
+    def _recent(self):
+        return self.samples[:min(self.frames, self.window)]
+
+    def percentiles(self, q=PERCENTILES):
+        """
+        Computes the percentiles of each stage over the frames in the ring.
+
+        Args:
+            q (tuple, optional): The percentiles to compute. Defaults to PERCENTILES.
+
+        Returns:
+            dict: The seconds at each percentile, as a list in the order of q, by stage name, empty before the first frame.
+
+        """
+        recent = self._recent()
+        if not len(recent):
+            return {}
+        values = np.percentile(recent, q, axis=0)
+        return {name: values[:, i].tolist() for i, name in enumerate(self.stages)}
+
+    def hud(self):
+        """Returns one 'stage p50/p95/p99 ms' line per stage, for an overlay"""
+        return [f"{name} {' '.join(f'{v * 1000:.1f}' for v in values)}" for name, values in self.percentiles().items()]
+
+    def report(self):
+        """Returns the p50 and p95 of each stage as a printable line"""
+        return ", ".join(f"{name} {values[0] * 1000:.1f}/{values[1] * 1000:.1f} ms" for name, values in self.percentiles((50, 95)).items())
+
+    def dump(self, path):
+        """
+        Writes the timings to a file, the per-frame stage times of the ring in milliseconds for a .csv path, the mean and percentiles of each stage for any other path as JSON.
+
+        Args:
+            path (str): The file to write.
+
+        """
+        recent = self._recent()
+        if self.frames > self.window:
+            # oldest frame first
+            recent = np.roll(recent, -(self.frames % self.window), axis=0)
+        if str(path).endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(('frame',) + self.stages)
+                first = self.frames - len(recent)
+                for i, row in enumerate(recent * 1000):
+                    writer.writerow([first + i] + [f"{v:.3f}" for v in row])
+            return
+        summary = {'frames': self.frames, 'window': len(recent), 'stages': {}}
+        percentiles = self.percentiles()
+        for i, name in enumerate(self.stages):
+            stats = {'mean': float(recent[:, i].mean() * 1000) if len(recent) else None}
+            stats.update({f"p{q}": value * 1000 for q, value in zip(PERCENTILES, percentiles.get(name, ()))})
+            summary['stages'][name] = stats
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+def main():
+    # the cost of the instrumentation itself on an empty frame
+    profiler = stageProfiler()
+    n = 100000
+    start = time.perf_counter()
+    for i in range(n):
+        profiler.start()
+        for stage in STAGES:
+            profiler.mark(stage)
+        profiler.end()
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / n * 1e6:.2f} us per frame for {len(STAGES)} marks")
+    profiler.percentiles()
+    start = time.perf_counter()
+    profiler.percentiles()
+    print(f"percentiles over {profiler.window} frames in {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(profiler.report())
+
+if __name__ == "__main__":
+    main()
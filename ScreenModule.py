@@ -0,0 +1,178 @@
+import numpy as np
+import time
+
+# order the calibration points are taken in
+CORNER_NAMES = ('top left', 'top right', 'bottom right', 'bottom left')
+
+
+def listMonitors(fallbackSize=None):
+    """
+    Lists the monitors of the virtual desktop with the primary one first. Needs the optional screeninfo package, without it only the primary screen of fallbackSize is known.
+
+    Args:
+        fallbackSize (tuple, optional): The width and height of the primary screen used when the monitors cannot be listed. Defaults to None.
+
+    Returns:
+        list: The (x, y, width, height) of each monitor in desktop coordinates.
+
+    """
+    try:
+        import screeninfo
+        monitors = screeninfo.get_monitors()
+    except Exception:
+        # not installed, or no display to ask
+        monitors = []
+    if not monitors:
+        return [(0, 0, int(fallbackSize[0]), int(fallbackSize[1]))] if fallbackSize else []
+    monitors = sorted(monitors, key=lambda m: not getattr(m, 'is_primary', False))
+    return [(m.x, m.y, m.width, m.height) for m in monitors]
+
+
+def desktopBounds(monitors):
+    """Returns the x0, y0, x1, y1 box spanning all monitors"""
+    return (min(x for x, y, w, h in monitors), min(y for x, y, w, h in monitors),
+            max(x + w for x, y, w, h in monitors), max(y + h for x, y, w, h in monitors))
+
+
+def homography(src, dst):
+    """
+    Solves the perspective transform taking four points onto four others.
+
+    Args:
+        src (list): The four (x, y) source points.
+        dst (list): The four (x, y) points they map to.
+
+    Returns:
+        ndarray: The 3x3 transform, normalized so its last element is 1.
+
+    """
+    a = np.zeros((8, 8))
+    b = np.zeros(8)
+    for i, ((x, y), (u, v)) in enumerate(zip(src, dst)):
+        a[2 * i] = (x, y, 1, 0, 0, 0, -u * x, -u * y)
+        a[2 * i + 1] = (0, 0, 0, x, y, 1, -v * x, -v * y)
+        b[2 * i], b[2 * i + 1] = u, v
+    return np.append(np.linalg.solve(a, b), 1.0).reshape(3, 3)
+
+
+class screenMapper():
+    """
+    A class that maps camera pixels to desktop coordinates with a transform computed once, instead of interpolating every frame. By default the camera box inside the frame reduction margin maps onto one monitor or onto the whole desktop; after calibration the four points pointed at map onto the corners of the target.
+
+    Args:
+        monitors (list): The (x, y, width, height) of each monitor, as returned by listMonitors.
+        camSize (tuple, optional): The width and height of the camera frame. Defaults to (640, 480).
+        margin (int, optional): The frame reduction in camera pixels on each side of the box. Defaults to 100.
+        monitor (int, optional): The index of the monitor to map onto, None to span every monitor. Defaults to 0.
+
+    Attributes:
+        bounds (tuple): The x0, y0, x1, y1 box of the target in desktop coordinates.
+        calibration (list): The four calibrated camera points, None when the margin box is used.
+        updates (int): The number of times the transform was computed.
+
+    """
+    def __init__(self, monitors, camSize=(640, 480), margin=100, monitor=0):
+        self.monitors = list(monitors)
+        self.camSize = camSize
+        self.margin = margin
+        self.monitor = monitor
+        self.calibration = None
+        self.updates = 0
+        self._update()
+
+    def _update(self):
+        if self.monitor is None or self.monitor >= len(self.monitors):
+            self.bounds = desktopBounds(self.monitors)
+        else:
+            x, y, w, h = self.monitors[self.monitor]
+            self.bounds = (x, y, x + w, y + h)
+        x0, y0, x1, y1 = self.bounds
+        # the last pixel, not the edge, so a clamped point is still on screen
+        corners = [(x0, y0), (x1 - 1, y0), (x1 - 1, y1 - 1), (x0, y1 - 1)]
+        if self.calibration is not None:
+            src = self.calibration
+        else:
+            w, h = self.camSize
+            m = self.margin
+            src = [(m, m), (w - m, m), (w - m, h - m), (m, h - m)]
+        self.matrix = homography(src, corners)
+        # plain floats, the per frame map is a handful of scalar operations
+        self._h = tuple(float(v) for v in self.matrix.ravel())
+        self.updates += 1
+
+    def map(self, x, y):
+        """
+        Maps a camera pixel to the desktop, clamped to the target.
+
+        Args:
+            x (float): The x coordinate in the camera frame.
+            y (float): The y coordinate in the camera frame.
+
+        Returns:
+            tuple: The x and y desktop coordinates.
+
+        """
+        h0, h1, h2, h3, h4, h5, h6, h7, h8 = self._h
+        w = h6 * x + h7 * y + h8
+        u = (h0 * x + h1 * y + h2) / w
+        v = (h3 * x + h4 * y + h5) / w
+        x0, y0, x1, y1 = self.bounds
+        return min(max(u, x0), x1 - 1), min(max(v, y0), y1 - 1)
+
+    def setMonitors(self, monitors):
+        """Replaces the monitor layout, recomputing only if it changed"""
+        monitors = list(monitors)
+        if monitors != self.monitors:
+            self.monitors = monitors
+            self._update()
+
+    def setMonitor(self, monitor):
+        """Chooses the monitor to map onto by index, None to span every monitor"""
+        if monitor != self.monitor:
+            self.monitor = monitor
+            self._update()
+
+    def nextMonitor(self):
+        """Maps onto the next monitor, spanning every monitor after the last one and starting over after that"""
+        if self.monitor is None:
+            self.setMonitor(0)
+        else:
+            self.setMonitor(self.monitor + 1 if self.monitor + 1 < len(self.monitors) else None)
+
+    def setCamera(self, camSize, margin=None):
+        """Changes the camera frame size and optionally the frame reduction margin"""
+        margin = self.margin if margin is None else margin
+        if (tuple(camSize), margin) != (tuple(self.camSize), self.margin):
+            self.camSize, self.margin = camSize, margin
+            self._update()
+
+    def calibrate(self, points):
+        """Maps the four camera points, in CORNER_NAMES order, onto the corners of the target"""
+        self.calibration = [(float(x), float(y)) for x, y in points]
+        self._update()
+
+    def resetCalibration(self):
+        """Goes back to mapping the margin box"""
+        if self.calibration is not None:
+            self.calibration = None
+            self._update()
+
+
+def main():
+    # compare against the two np.interp calls per frame it replaces
+    wCam, hCam, frameR = 640, 480, 100
+    wScr, hScr = 1920, 1080
+    mapper = screenMapper(listMonitors((wScr, hScr)), (wCam, hCam), frameR)
+    points = np.random.default_rng(0).uniform((0, 0), (wCam, hCam), (100000, 2)).tolist()
+    start = time.perf_counter()
+    expected = [(np.interp(x, (frameR, wCam - frameR), (0, wScr)), np.interp(y, (frameR, hCam - frameR), (0, hScr))) for x, y in points]
+    interpTime = time.perf_counter() - start
+    start = time.perf_counter()
+    mapped = [mapper.map(x, y) for x, y in points]
+    mapTime = time.perf_counter() - start
+    error = np.abs(np.subtract(expected, mapped)).max()
+    print(f"np.interp {interpTime / len(points) * 1e6:.2f} us, screenMapper {mapTime / len(points) * 1e6:.2f} us per point, max difference {error:.2f} px")
+    print("monitors:", mapper.monitors, "target:", mapper.bounds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import cv2
+import numpy as np
+import os
+import sys
+import time
+
+# files an image directory is read from, in name order
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def openSource(source=0, size=None, realtime=True, fps=None, loop=False):
+    """
+    Opens a frame source with the read, grab and retrieve interface of cv2.VideoCapture, so frameGrabber and the entry points take a camera, a video file or an image directory alike.
+
+    Args:
+        source (int or str, optional): A camera index, the path of a video file or the path of a directory of images. Defaults to 0.
+        size (tuple, optional): The width and height of the frames, requested from a camera and scaled to for files, None to keep the native size. Defaults to None.
+        realtime (bool, optional): Whether files play at their native frame rate, like a camera, instead of as fast as they are read. Defaults to True.
+        fps (float, optional): The frame rate of a file source, None for the rate of the video or 30 for images. Defaults to None.
+        loop (bool, optional): Whether a file source starts over at its end instead of ending. Defaults to False.
+
+    Returns:
+        object: A cv2.VideoCapture for a camera, a videoSource or an imageSource for a path.
+
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        cap = cv2.VideoCapture(int(source))
+        if size is not None:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        return cap
+    if os.path.isdir(source):
+        return imageSource(source, size, realtime, fps or 30, loop)
+    if not os.path.isfile(source):
+        raise FileNotFoundError(f"no camera, video or image directory at {source}")
+    return videoSource(source, size, realtime, fps, loop)
+
+
+class fileSource():
+    """
+    The pacing, scaling and end of stream shared by the file sources. Subclasses read frame number position with _grab and decode it with _retrieve.
+
+    Args:
+        size (tuple): The width and height frames are scaled to, None to keep the native size.
+        realtime (bool): Whether frames are paced at fps instead of delivered as fast as they are read.
+        fps (float): The frame rate of the source.
+        loop (bool): Whether the source starts over at its end instead of ending.
+
+    Attributes:
+        position (int): The number of the current frame.
+        frameCount (int): The number of frames in the source.
+        ended (bool): Whether the last frame was read and the source is closed.
+
+    """
+    def __init__(self, size, realtime, fps, loop):
+        self.size = tuple(size) if size is not None else None
+        self.realtime = realtime
+        self.fps = fps
+        self.loop = loop
+        self.position = -1
+        self.frameCount = 0
+        self.ended = False
+        self._start = None
+        self._scratch = None
+        self._scaling = size is not None
+
+    def _pace(self):
+        # frame n is due n / fps after the first one, as a camera would deliver it
+        if self._start is None:
+            self._start = time.perf_counter() - self.position / self.fps
+        delay = self._start + self.position / self.fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _fit(self, img, buf):
+        # scale or copy into the caller's buffer so pooled grabbers keep reusing it
+        if img is buf:
+            return img
+        if self._scaling:
+            if buf is not None and (buf.shape[1], buf.shape[0]) == self.size:
+                return cv2.resize(img, self.size, dst=buf, interpolation=cv2.INTER_AREA)
+            return cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        if buf is not None and buf.shape == img.shape:
+            np.copyto(buf, img)
+            return buf
+        return img
+
+    def grab(self):
+        """Advances to the next frame, waiting for it when realtime, and returns whether there is one"""
+        if self.ended:
+            return False
+        self.position += 1
+        if self.position >= self.frameCount or not self._grab():
+            if not self.loop or self.position == 0:
+                self.ended = True
+                return False
+            self._rewind()
+            self.position, self._start = 0, None
+            if not self._grab():
+                self.ended = True
+                return False
+        if self.realtime:
+            self._pace()
+        return True
+
+    def retrieve(self, buf=None):
+        """Decodes the current frame, into buf when it has the frame shape, and returns the success flag and the frame"""
+        if self.ended or self.position < 0:
+            return False, None
+        # decode straight into buf unless the frame is scaled afterwards, the scratch array never leaves the source
+        img = self._retrieve(self._scratch if self._scaling else buf)
+        if img is None:
+            return False, None
+        self._scaling = self.size is not None and (img.shape[1], img.shape[0]) != self.size
+        if self._scaling:
+            self._scratch = img
+        elif img is self._scratch:
+            # a frame already at the target size was decoded into the scratch, hand it over and stop reusing it
+            self._scratch = None
+        return True, self._fit(img, buf)
+
+    def read(self, buf=None):
+        """Grabs and decodes the next frame, like cv2.VideoCapture.read"""
+        if not self.grab():
+            return False, None
+        return self.retrieve(buf)
+
+    def isOpened(self):
+        """Returns whether frames are left to read"""
+        return not self.ended
+
+    def set(self, propId, value):
+        """Seeks to a frame with CAP_PROP_POS_FRAMES, other properties of a file cannot be set"""
+        if propId == cv2.CAP_PROP_POS_FRAMES and 0 <= value < self.frameCount:
+            self._rewind(int(value))
+            self.position, self._start, self.ended = int(value) - 1, None, False
+            return True
+        return False
+
+    def get(self, propId):
+        """Reads the frame rate, size, count or position of the source"""
+        if propId == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if propId == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frameCount)
+        if propId == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position + 1)
+        if propId in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            size = self.size or self._nativeSize()
+            return float(size[0] if propId == cv2.CAP_PROP_FRAME_WIDTH else size[1])
+        return 0.0
+
+    def release(self):
+        """Closes the source"""
+        self.ended = True
+
+
+class videoSource(fileSource):
+    """
+    A frame source that plays a video file.
+
+    Args:
+        path (str): The video file.
+        size (tuple, optional): The width and height frames are scaled to, None to keep the native size. Defaults to None.
+        realtime (bool, optional): Whether frames are paced at the video frame rate instead of delivered as fast as they are decoded. Defaults to True.
+        fps (float, optional): The frame rate to play at, None for the rate stored in the file. Defaults to None.
+        loop (bool, optional): Whether the video starts over at its end instead of ending. Defaults to False.
+
+    """
+    def __init__(self, path, size=None, realtime=True, fps=None, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"cannot open video {path}")
+        super().__init__(size, realtime, fps or self.cap.get(cv2.CAP_PROP_FPS) or 30, loop)
+        # some containers do not store the count, read until the decoder runs out then
+        self.frameCount = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or sys.maxsize
+
+    def _grab(self):
+        return self.cap.grab()
+
+    def _retrieve(self, buf):
+        success, img = self.cap.retrieve(buf) if buf is not None else self.cap.retrieve()
+        return img if success else None
+
+    def _rewind(self, position=0):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+
+    def _nativeSize(self):
+        return self.cap.get(cv2.CAP_PROP_FRAME_WIDTH), self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+
+    def release(self):
+        """Closes the video file"""
+        super().release()
+        self.cap.release()
+
+
+class imageSource(fileSource):
+    """
+    A frame source that plays the images of a directory in name order, such as frames exported from a recording.
+
+    Args:
+        path (str): The directory of images.
+        size (tuple, optional): The width and height frames are scaled to, None to keep the size of each image. Defaults to None.
+        realtime (bool, optional): Whether frames are paced at fps instead of delivered as fast as they are loaded. Defaults to True.
+        fps (float, optional): The frame rate to play at. Defaults to 30.
+        loop (bool, optional): Whether the sequence starts over at its end instead of ending. Defaults to False.
+
+    Attributes:
+        files (list): The paths of the images, in play order.
+
+    """
+    def __init__(self, path, size=None, realtime=True, fps=30, loop=False):
+        super().__init__(size, realtime, fps, loop)
+        self.path = path
+        self.files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+        if not self.files:
+            raise IOError(f"no images in {path}")
+        self.frameCount = len(self.files)
+
+    def _grab(self):
+        # loading is deferred to retrieve, so skipped frames cost nothing
+        return True
+
+    def _retrieve(self, buf):
+        return cv2.imread(self.files[self.position], cv2.IMREAD_COLOR)
+
+    def _rewind(self, position=0):
+        pass
+
+    def _nativeSize(self):
+        img = cv2.imread(self.files[0], cv2.IMREAD_COLOR)
+        return img.shape[1], img.shape[0]
+
+
+def main():
+    # play a source as fast as possible and report the read rate, python SourceModule.py [video or image directory]
+    source = openSource(sys.argv[1] if len(sys.argv) > 1 else 0, (640, 480), realtime=False)
+    count = 0
+    buf = np.zeros((480, 640, 3), np.uint8)
+    start = time.perf_counter()
+    while count < 1000:
+        success, img = source.read(buf)
+        if not success:
+            break
+        count += 1
+    elapsed = time.perf_counter() - start
+    source.release()
+    if count:
+        print(f"{count} frames in {elapsed:.2f} s, {count / elapsed:.0f} fps, {source.get(cv2.CAP_PROP_FPS):.0f} fps native")
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,273 @@
 import cv2
-import numpy as np
 import HandModule as htm
+import GestureModule as gsm
+import CaptureModule as cpm
+import MotionModule as mtm
+import GovernorModule as gvm
+import FilterModule as flm
+import sys
 import time
-import autopy
-import pyautogui as pag
+import InputModule as ipm
+import OverlayModule as ovm
+import ProfileModule as pfm
+import ScreenModule as scm
+import SourceModule as srm
 
 
 # Constants for the video capture and frame reduction
-wCam, hCam = 640, 480 # wCam, hCam = 1280, 720 but reduce fps
+wCam, hCam = 640, 480 # wCam, hCam = 1280, 720 with inferenceScale = 0.5 keeps the fps
+frameSource = 0  # camera index, or the path of a video file or image directory to replay
+sourceRealtime = True  # replay files at their native rate, False to process every frame of a file as fast as possible, cameras always give the newest frame
+dryRun = False  # send the input to a null backend that only records it
 frameR = 100  # Frame Reduction
-smoothening = 7
-
-# Initialize variables for mouse movement and clicks
-pTime = 0
-plocX, plocY = 0, 0
-clocX, clocY = 0, 0
-
-# Initialize the video capture object
-cap = cv2.VideoCapture(0)
-cap.set(3, wCam)
-cap.set(4, hCam)
-
-# Initialize the hand detector object, screen size amd click flag
-detector = htm.handDetector(maxHands=2, detectionCon=0.5,trackCon=0.8)
-wScr, hScr = autopy.screen.size()  # 1536.0 864.0
-clickFlag = 0
-
-# Main loop to continuously process frames
-while True:
-    # 1. Find hand Landmarks
-    success, img = cap.read()
-    img = cv2.flip(img, 1)
-    img = detector.findHands(img)
-    lmListL, lmListR = detector.findPosition(img,draw=False)
-
-    # 2. Get the tip of the index
-    if len(lmListR) != 0:
-        x1, y1 = lmListR[8][1:] # fix this with line 56,60 in startseperate.py
-        # print(x1, y1)
-
-    # 3. Check which fingers are up
-    fingersL, fingersR = detector.fingersUp()
-    print(fingersL, fingersR)  # [0, 0, 0, 0, 0]
-
-    distance, img = detector.findDistanceBetweenHands(img)
-    # print("Distance between hands:", distance)
-
-    if fingersR[1] == 1 and fingersR[2:] == [0, 0, 0]: # moving mode
-
-        # 5. Convert Coordinates
-        x3 = np.interp(x1, (frameR, wCam - frameR), (0, wScr))
-        y3 = np.interp(y1, (frameR, hCam - frameR), (0, hScr))
-        # print(x3, y3)
-
-        # 6. Smoothen Values
-        clocX = plocX + (x3 - plocX) / smoothening
-        clocY = plocY + (y3 - plocY) / smoothening
-        # print(clocX)
-
-        # 7. Move Mouse by autopy
-        # print("moving mode")
-        cv2.putText(img, "Moving", (45, 50), cv2.FONT_HERSHEY_PLAIN, 1, (0, 252, 0), 2)
-        autopy.mouse.move(clocX, clocY)
-        #  cv2.circle(img, (x1, y1), 15, (255, 36, 15), cv2.FILLED)
-        plocX, plocY = clocX, clocY
-
-        # 8. Both Index and middle fingers are up : Clicking Left Mode
-        # if fingersL[0] == 1 and fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-        if fingersL == [1, 1, 1, 0, 0]:
-            # 9. Find distance between fingers
-            length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-            # print(lineInfo)
-            print("Left Click : its length is ", length)
-            cv2.putText(img, "Left Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-
-            # 10. Click mouse if distance short
-            if length < 0.15 and clickFlag == 0:
-                #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                cv2.circle(img, (25, 65), 10, (0, 255, 127), cv2.FILLED)
-                pag.mouseDown(button='left')
-                clickFlag = 1
-            elif length > 0.25 and clickFlag == 1:
-                cv2.circle(img, (25, 65), 10, (200, 0, 100), cv2.FILLED)
-                pag.mouseUp()
-                clickFlag = 0
-
-        # 9. Thumb, index, and middle fingers are up : right click
-        # if fingersL[0] == 0 and fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-        if fingersL == [0, 1, 1, 0, 0]:
-            # 9.1. Find distance between fingers
-            length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-            #print("Right Click : its length is ", length)
-            cv2.putText(img, "Right Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-            # 9.2. Click mouse if distance short
-            if length < 0.15 and clickFlag == 0:
-                #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                cv2.circle(img, (25, 65), 8, (100, 0, 200), cv2.FILLED)
-                pag.mouseDown(button='right')
-                clickFlag = 1
-            elif length > 0.25 and clickFlag == 1:
-                cv2.circle(img, (25, 65), 8, (200, 0, 100), cv2.FILLED)
-                pag.mouseUp(button='right')
-                clickFlag = 0
-
-        # 10. index, middle, and ring fingers are up : middle click
-        if fingersL[0:4] == [1,1,1,1,0]:
-            # 10.1. Find distance between fingers
-            length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-            #   print("Middle click : both length are ", length)
-            cv2.putText(img, "Middle Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-
-            # 10.2. Click mouse if distance short
-            if length < 0.15 and clickFlag == 0:
-                #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                cv2.circle(img, (25, 65), 8, (100, 0, 200), cv2.FILLED)
-                pag.mouseDown(button='middle')
-                clickFlag = 1
-            elif length > 0.25 and clickFlag == 1:
-                cv2.circle(img, (25, 65), 8, (200, 0, 100), cv2.FILLED)
-                pag.mouseUp(button='middle')
-                clickFlag = 0
-
-    elif fingersR[1:3] == [1, 1] and not any(fingersR[3:]):
-        cv2.putText(img, "Scrolling", (45, 50), cv2.FONT_HERSHEY_PLAIN, 1, (0, 252, 0), 2)
-        if fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-            pag.scroll(30)
-            cv2.putText(img, "UP", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-        elif fingersL[1] == 0 and fingersL[2] == 0 and fingersL[3] == 0 and fingersL[4] == 0:
-            cv2.putText(img, "DOWN", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-            pag.scroll(-30)
-
-    elif all(fingersR[1:]) and not fingersR[0]:
-        pag.mouseUp(button='left')
-        pag.mouseUp(button='right')
-        pag.mouseUp(button='middle')
-    # cv2.rectangle(img, (frameR, frameR), (wCam - frameR, hCam - frameR), (255, 0, 255), 2)
-
-
-    # 11. Frame Rate
-    cTime = time.time()
-    fps = 1 / (cTime - pTime)
-    pTime = cTime
-    cv2.putText(img, str(int(fps)), (20, 50), cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 0), 2)
-    
-    # 12. Display
-    cv2.imshow("Image", img)
-    esc = cv2.waitKey(1) & 0xff #  if pressed esc
-    if esc == 27:
-        pag.mouseUp(button='left')
-        pag.mouseUp(button='right')
-        pag.mouseUp(button='middle')
-        break
-cv2.destroyAllWindows()
+screenMonitor = 0  # index of the monitor the hand maps onto, None to span every monitor
+cursorFilter = 'oneeuro'  # cursor smoothing: 'oneeuro', 'ema' or 'none'
+cursorPrediction = False  # extrapolate the cursor over the capture-to-move latency
+scrollMode = 'gesture'  # 'gesture' scrolls up or down and speeds up while held, 'proportional' follows the hand height
+cursorRate = None  # move the cursor at this rate in Hz, e.g. the display refresh rate, None for once per frame
+inferenceProcess = False  # run MediaPipe in a separate process, needs Python 3.8
+roiTracking = False  # detect on a crop around the hands of the previous frame, not with inferenceProcess
+inferenceScale = 1.0  # downscale frames by this factor before inference
+keyframeInterval = 1  # detect every this many frames, predict the landmarks in between
+motionGating = False  # skip detection while the scene is static
+idlePower = False  # drop to low rate and resolution while no hands are seen
+targetFps = None  # step detection quality down to hold this frame rate, None to disable
+headless = False  # no overlay and no window, only drive the input, stop with Ctrl+C
+previewScale = 0.5  # size of the preview window relative to the camera frame
+mirrorLandmarks = False  # mirror the landmarks instead of flipping every frame
+previewFps = 15  # preview refresh rate, below the control loop rate so drawing does not slow the cursor
+profileHud = False  # show the p50/p95/p99 time of each stage in the preview, capture is the wait for the camera
+profileDump = None  # write the stage timings to this .csv or .json file on exit
+traceDump = None  # write the capture-to-injection time of every input event to this .csv file on exit
 
+def main(headless=headless, frames=None, backend=None, source=frameSource, realtime=sourceRealtime):
+    """
+    Runs the gesture mouse until esc is pressed, or Ctrl+C when headless, or until a replayed file ends.
+
+    Args:
+        headless (bool, optional): Whether to skip every overlay and the preview window. Defaults to the headless setting.
+        frames (int, optional): The number of frames to process before stopping, None to run until stopped. Defaults to None.
+        backend (object, optional): The input backend, such as InputModule.nullBackend for a dry run. Defaults to a pyautoguiBackend.
+        source (int or str, optional): The camera index, video file or image directory to read. Defaults to the frameSource setting.
+        realtime (bool, optional): Whether a file plays at its native rate, dropping frames the loop is too slow for, instead of every frame as fast as possible. A camera always gives its newest frame. Defaults to the sourceRealtime setting.
+
+    Returns:
+        tuple: The number of frames processed and the seconds spent processing them, not counting the wait for the camera.
+
+    """
+    # Initialize variables for mouse movement and clicks
+    pTime = 0
+    count, busy = 0, 0.0
+
+    # Initialize the video capture object, a camera or a replayed file
+    cap = srm.openSource(source, (wCam, hCam), realtime)
+    # read frames on their own thread so inference always gets the newest one, or every frame of a file played as fast as possible
+    # a camera keeps serving its newest frame whatever the setting, only files can wait for the loop
+    grabber = cpm.frameGrabber(cap, lossless=not realtime and isinstance(cap, srm.fileSource)).start()
+
+    # Initialize the hand detector object, input sink, screen size and gesture engine
+    profiler = pfm.stageProfiler()
+    detector = htm.handDetector(maxHands=2, detectionCon=0.5, trackCon=0.8,
+                                inferenceProcess=inferenceProcess, frameShape=(hCam, wCam, 3),
+                                roiTracking=roiTracking, inferenceScale=inferenceScale,
+                                keyframeInterval=keyframeInterval,
+                                motionGate=mtm.motionGate() if motionGating else None,
+                                mirror=mirrorLandmarks, profiler=profiler)
+    quality = gvm.qualityController(detector, targetFps) if targetFps else None
+    # the quality controller keeps the inference scale while idle, the governor only pauses it
+    governor = gvm.idleGovernor(detector, grabber, quality=quality) if idlePower else None
+    sink = ipm.inputSink(backend).start()
+    # map camera pixels to the desktop, press c with the index tip on each corner in turn, from the top left clockwise, to calibrate,
+    # m to move to the next monitor and r to reread the monitors and drop the calibration
+    mapper = scm.screenMapper(scm.listMonitors(sink.screenSize()), (wCam, hCam), frameR, screenMonitor)
+    corners = []
+    engine = gsm.gestureEngine()
+    smoother = flm.CURSOR_FILTERS[cursorFilter]()
+    predictor = flm.cursorPredictor() if cursorPrediction else None
+    scroller = ipm.scrollEngine(sink).start()
+    scheduler = ipm.cursorScheduler(sink, cursorRate).start() if cursorRate else None
+    overlay = None if headless else ovm.overlayRenderer((int(wCam * previewScale), int(hCam * previewScale)), previewFps, mirror=mirrorLandmarks)
+
+    # Main loop to continuously process frames
+    try:
+        while frames is None or count < frames:
+            # 1. Find hand Landmarks
+            profiler.start()
+            success, seq, timestamp, img = grabber.readFrame()
+            if not success:
+                if grabber.ended:
+                    break
+                continue
+            profiler.mark('capture')
+            tStart = time.perf_counter()
+            if not mirrorLandmarks:
+                # flip in place, the frame is a pooled buffer of the grabber
+                cv2.flip(img, 1, dst=img)
+            profiler.mark('convert')
+            img = detector.findHands(img, draw=False, timestamp=timestamp, seq=seq)
+            tInference = time.perf_counter()
+            lmListL, lmListR = detector.findPosition(img,draw=False)
+            # every input event from this frame is traced back to the capture of the frame its landmarks came from
+            frame = (detector.sourceSeq, detector.sourceTime)
+            profiler.mark('landmarks')
+            if governor is not None:
+                governor.update(detector.handPresent.any(), timestamp)
+
+            # 2. Get the tip of the index
+            if len(lmListR) != 0:
+                x1, y1 = lmListR[8][1:] # fix this with line 56,60 in startseperate.py
+                # print(x1, y1)
+
+            # 3. Check which fingers are up and resolve the gesture
+            masks, ratios = detector.features.masks(), detector.features.ratios()
+            action, events = engine.update(masks[htm.LEFT], masks[htm.RIGHT], ratios[htm.LEFT, 1])
+            profiler.mark('gesture')
+
+            if action in gsm.MOVING: # moving mode
+
+                # 5. Convert Coordinates, from the frame size the camera actually delivers
+                mapper.setCamera(img.shape[1::-1])
+                x3, y3 = mapper.map(x1, y1)
+                # print(x3, y3)
+
+                # 6. Smoothen Values
+                clocX, clocY = smoother.filter(x3, y3, timestamp)
+                if predictor is not None:
+                    clocX, clocY = predictor.predict(clocX, clocY, timestamp, time.perf_counter() - timestamp)
+                # print(clocX)
+
+                # 7. Move Mouse through the input sink, or glide there at the output rate
+                if scheduler is not None:
+                    scheduler.setTarget(clocX, clocY, frame=frame)
+                else:
+                    sink.move(clocX, clocY, frame=frame)
+                #  cv2.circle(img, (x1, y1), 15, (255, 36, 15), cv2.FILLED)
+
+            # Scroll at a velocity set by the gesture, the scroll engine sends the wheel clicks at its own tick
+            if scrollMode == 'proportional' and action in (gsm.SCROLL, gsm.SCROLL_UP, gsm.SCROLL_DOWN):
+                scroller.update(height=(hCam / 2 - y1) / (hCam / 2 - frameR), now=timestamp, frame=frame)
+            else:
+                scroller.update(1 if action == gsm.SCROLL_UP else -1 if action == gsm.SCROLL_DOWN else 0, now=timestamp, frame=frame)
+
+            # 8. Press or release the buttons whose pinch crossed a threshold
+            for button, down in events:
+                if down:
+                    sink.press(button, frame=frame)
+                else:
+                    sink.release(button, frame=frame)
+                if overlay is not None:
+                    overlay.flash(down)
+            # cv2.rectangle(img, (frameR, frameR), (wCam - frameR, hCam - frameR), (255, 0, 255), 2)
+            profiler.mark('input')
+            if quality is not None:
+                tEnd = time.perf_counter()
+                quality.update(tEnd - tStart, {'inference': tInference - tStart, 'control': tEnd - tInference})
+
+            count += 1
+            # 9. Frame Rate
+            cTime = time.perf_counter()
+            fps = 1 / (cTime - pTime)
+            pTime = cTime
+            if overlay is None or not overlay.due():
+                busy += time.perf_counter() - tStart
+                profiler.end()
+                continue
+
+            # 10. Display a downscaled preview with the HUD
+            mode, detail = gsm.ACTION_LABELS[action]
+            hud = [(str(int(fps)), (20, 50), ovm.BLACK), (f"dropped {grabber.dropped} behind {grabber.behind()}", (20, 30), ovm.BLACK)]
+            if mode:
+                hud.append((mode, (45, 50), ovm.GREEN))
+            if detail:
+                hud.append((detail, (45, 70), ovm.BLUE))
+            if corners:
+                hud.append((f"calibrate {scm.CORNER_NAMES[len(corners)]}", (20, 90), ovm.RED))
+            if profileHud:
+                hud.extend((line, (20, 110 + 14 * i), ovm.BLACK) for i, line in enumerate(profiler.hud()))
+            cv2.imshow("Image", overlay.render(img, detector.lmNorm, detector.handPresent, hud))
+            esc = cv2.waitKey(1) & 0xff #  if pressed esc
+            busy += time.perf_counter() - tStart
+            profiler.mark('display')
+            profiler.end()
+            if esc == ord('c') and len(lmListR) != 0:
+                corners.append(lmListR[8][1:])
+                if len(corners) == len(scm.CORNER_NAMES):
+                    mapper.calibrate(corners)
+                    corners = []
+            if esc == ord('m'):
+                mapper.nextMonitor()
+            if esc == ord('r'):
+                monitors = scm.listMonitors(sink.screenSize())
+                mapper.setMonitors(monitors)
+                sink.setMonitors(monitors)
+                mapper.resetCalibration()
+                corners = []
+            if esc == 27:
+                break
+    except KeyboardInterrupt:
+        pass
+    # let go of any held button
+    for button, down in engine.releaseAll():
+        sink.release(button)
+    grabber.release()
+    detector.close()
+    if scheduler is not None:
+        scheduler.stop()
+    scroller.stop()
+    sink.stop()
+    if governor is not None:
+        print("idle governor:", governor.report())
+    if quality is not None:
+        print("quality:", quality.report())
+    if roiTracking:
+        print(f"roi: {detector.roiFrames} cropped, {detector.fullFrames} full, {detector.roiMisses} misses")
+    print("features:", detector.features.report())
+    print("stages p50/p95:", profiler.report())
+    if profileDump:
+        profiler.dump(profileDump)
+    print("input latency p50/p95/p99:", sink.traceReport())
+    if traceDump:
+        sink.dumpTrace(traceDump)
+    if predictor is not None:
+        print(f"cursor prediction removed {100 * predictor.errorReduction():.0f}% of the error")
+    if count:
+        print(f"{'headless' if headless else 'with display'}: {count} frames, {busy / count * 1000:.2f} ms per frame ({count / busy:.0f} fps of processing)")
+    if not headless:
+        cv2.destroyAllWindows()
+    return count, busy
+
+
+def compareThroughput(frames=300, source=frameSource, realtime=sourceRealtime):
+    """Runs the same number of frames with and without display through the null backend and prints the processing rate of each"""
+    results = {}
+    for mode in (False, True):
+        count, busy = main(headless=mode, frames=frames, backend=ipm.nullBackend(), source=source, realtime=realtime)
+        results[mode] = busy / max(count, 1)
+    print(f"display costs {(results[False] - results[True]) * 1000:.2f} ms per frame, headless processes {results[False] / results[True]:.2f}x as many frames")
+
+def compareRoi(frames=300, source=frameSource, realtime=sourceRealtime):
+    """Runs the same frames headless with and without ROI tracking through the null backend and prints the processing time of each, best on a recording with hands played with realtime False"""
+    global roiTracking
+    configured = roiTracking
+    results = {}
+    for mode in (False, True):
+        roiTracking = mode
+        count, busy = main(headless=True, frames=frames, backend=ipm.nullBackend(), source=source, realtime=realtime)
+        results[mode] = busy / max(count, 1)
+    roiTracking = configured
+    print(f"full frames {results[False] * 1000:.2f} ms, roi tracking {results[True] * 1000:.2f} ms per frame ({100 * (1 - results[True] / results[False]):.0f}% saved)")
+
+if __name__ == "__main__":
+    # python bare_app.py [--headless] [--source camera, video or image directory] [--fast] [--dry-run] [--compare [frames]] [--compare-roi [frames]]
+    # e.g. --source clip.mp4 --fast --headless --dry-run replays every frame of a recording without a camera or a desktop
+    source = sys.argv[sys.argv.index('--source') + 1] if '--source' in sys.argv[:-1] else frameSource
+    realtime = sourceRealtime and '--fast' not in sys.argv
+    if '--compare-roi' in sys.argv:
+        args = sys.argv[sys.argv.index('--compare-roi') + 1:]
+        compareRoi(int(args[0]) if args and args[0].isdigit() else 300, source, realtime)
+    elif '--compare' in sys.argv:
+        args = sys.argv[sys.argv.index('--compare') + 1:]
+        compareThroughput(int(args[0]) if args and args[0].isdigit() else 300, source, realtime)
+    else:
+        main(headless=headless or '--headless' in sys.argv, backend=ipm.nullBackend() if dryRun or '--dry-run' in sys.argv else None,
+             source=source, realtime=realtime)
@@ -2,147 +2,227 @@ from PyQt5 import QtGui
 from PyQt5.QtWidgets import QWidget, QApplication, QLabel, QVBoxLayout
 from PyQt5.QtGui import QPixmap
 import sys
+import time
 import cv2
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QThread
-import numpy as np
+from PyQt5.QtCore import pyqtSlot, Qt, QThread, QTimer
 import HandModule as htm
-import autopy
-import pyautogui as pag
+import GestureModule as gsm
+import CaptureModule as cpm
+import MotionModule as mtm
+import GovernorModule as gvm
+import FilterModule as flm
+import InputModule as ipm
+import OverlayModule as ovm
+import ProfileModule as pfm
+import ScreenModule as scm
+import SourceModule as srm
 
 
 class VideoThread(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
 
     def __init__(self):
         super().__init__()
         self._run_flag = True
          # Constants for the video capture and frame reduction
         self.wCam, self.hCam = 640, 480
+        self.frameSource = 0  # camera index, or the path of a video file or image directory to replay
+        self.sourceRealtime = True  # replay files at their native rate, False to process every frame of a file as fast as possible, cameras always give the newest frame
+        self.dryRun = False  # send the input to a null backend that only records it
         self.frameR = 100  # Frame Reduction
-        self.smoothening = 7
-        self.plocX, self.plocY = 0, 0
+        self.screenMonitor = 0  # index of the monitor the hand maps onto, None to span every monitor
+        self.cursorFilter = 'oneeuro'  # cursor smoothing: 'oneeuro', 'ema' or 'none'
+        self.cursorPrediction = False  # extrapolate the cursor over the capture-to-move latency
+        self.scrollMode = 'gesture'  # 'gesture' scrolls up or down and speeds up while held, 'proportional' follows the hand height
+        self.cursorRate = None  # move the cursor at this rate in Hz, e.g. the display refresh rate, None for once per frame
+        self.inferenceProcess = False  # run MediaPipe in a separate process, needs Python 3.8
+        self.roiTracking = False  # detect on a crop around the hands of the previous frame, not with inferenceProcess
+        self.inferenceScale = 1.0  # downscale frames by this factor before inference
+        self.keyframeInterval = 1  # detect every this many frames, predict the landmarks in between
+        self.motionGating = False  # skip detection while the scene is static
+        self.idlePower = False  # drop to low rate and resolution while no hands are seen
+        self.targetFps = None  # step detection quality down to hold this frame rate, None to disable
+        self.headless = False  # no overlay and no preview, set by --headless, which also runs without the window until Ctrl+C
+        self.previewSize = (640, 480)  # size of the preview sent to the window
+        self.mirrorLandmarks = False  # mirror the landmarks instead of flipping every frame
+        self.previewFps = 15  # preview refresh rate, below the control loop rate so drawing does not slow the cursor
+        self.profileHud = False  # show the p50/p95/p99 time of each stage in the preview, capture is the wait for the camera
+        self.profileDump = None  # write the stage timings to this .csv or .json file on exit
+        self.traceDump = None  # write the capture-to-injection time of every input event to this .csv file on exit
         self.clocX, self.clocY = 0, 0
+        self._calibrate = False
+        self._nextMonitor = False
+        self._resetScreen = False
+        # the GUI pulls the latest preview from here on its own timer
+        self.preview = ovm.previewChannel((self.previewSize[1], self.previewSize[0], 3))
 
 
     def run(self):
-        # capture from web cam
-        cap = cv2.VideoCapture(0)
-        cap.set(3, self.wCam)
-        cap.set(4, self.hCam)
-        # Initialize the hand detector object, screen size, and click flag
-        detector = htm.handDetector(maxHands=2, detectionCon=0.5, trackCon=0.8)
-        wScr, hScr = autopy.screen.size()
-        clickFlag = 0
-        while self._run_flag:
-            ret, cv_img = cap.read()  
-            cv_img = cv2.flip(cv_img, 1)
-            if ret:
-                img = detector.findHands(cv_img)
-                lmListL, lmListR = detector.findPosition(img,draw=False)
-
-                # 2. Get the tip of the index
-                if len(lmListR) != 0:
-                    x1, y1 = lmListR[8][1:] # fix this with line 56,60 in startseperate.py
-                    # print(x1, y1)
-
-                # 3. Check which fingers are up
-                fingersL, fingersR = detector.fingersUp()
-                # print(fingersL, fingersR)  # [0, 0, 0, 0, 0]
-
-                distance, img = detector.findDistanceBetweenHands(img)
-                # print("Distance between hands:", distance)
-
-                if fingersR[1] == 1 and fingersR[2:] == [0, 0, 0]: # moving mode
-                    # 5. Convert Coordinates
-                    x3 = np.interp(x1, (self.frameR, self.wCam - self.frameR), (0, wScr))
-                    y3 = np.interp(y1, (self.frameR, self.hCam - self.frameR), (0, hScr))
-                    # print(x3, y3)
-
-                    # 6. Smoothen Values
-                    clocX = self.plocX + (x3 - self.plocX) / self.smoothening
-                    clocY = self.plocY + (y3 - self.plocY) / self.smoothening
-                    # print(clocX)
-
-                    # 7. Move Mouse by autopy
-                    # print("moving mode")
-                    cv2.putText(img, "Moving", (45, 50), cv2.FONT_HERSHEY_PLAIN, 1, (0, 252, 0), 2)
-                    autopy.mouse.move(clocX, clocY)
-                    #  cv2.circle(img, (x1, y1), 15, (255, 36, 15), cv2.FILLED)
-                    self.plocX, self.plocY = clocX, clocY
-                    # 8. Both Index and middle fingers are up : Clicking Left Mode
-                    # if fingersL[0] == 1 and fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-                    if fingersL == [1, 1, 1, 0, 0]:
-                        # 9. Find distance between fingers
-                        length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-                        # print(lineInfo)
-                        # print("Left Click : its length is ", length)
-                        cv2.putText(img, "Left Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-
-                        # 10. Click mouse if distance short
-                        if length < 0.15 and clickFlag == 0:
-                            #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                            cv2.circle(img, (25, 65), 10, (0, 255, 127), cv2.FILLED)
-                            pag.mouseDown(button='left')
-                            clickFlag = 1
-                        elif length > 0.25 and clickFlag == 1:
-                            cv2.circle(img, (25, 65), 10, (200, 0, 100), cv2.FILLED)
-                            pag.mouseUp()
-                            clickFlag = 0
-
-                    # 9. Thumb, index, and middle fingers are up : right click
-                    # if fingersL[0] == 0 and fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-                    if fingersL == [0, 1, 1, 0, 0]:
-                        # 9.1. Find distance between fingers
-                        length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-                        #print("Right Click : its length is ", length)
-                        cv2.putText(img, "Right Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-                        # 9.2. Click mouse if distance short
-                        if length < 0.15 and clickFlag == 0:
-                            #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                            cv2.circle(img, (25, 65), 8, (100, 0, 200), cv2.FILLED)
-                            pag.mouseDown(button='right')
-                            clickFlag = 1
-                        elif length > 0.25 and clickFlag == 1:
-                            cv2.circle(img, (25, 65), 8, (200, 0, 100), cv2.FILLED)
-                            pag.mouseUp(button='right')
-                            clickFlag = 0
-
-                    # 10. index, middle, and ring fingers are up : middle click
-                    if fingersL[0:4] == [1,1,1,1,0]:
-                        # 10.1. Find distance between fingers
-                        length, img, lineInfo = detector.findRatio(8, 12, img, re=255, g=208, b=42)
-                        #   print("Middle click : both length are ", length)
-                        cv2.putText(img, "Middle Click", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-
-                        # 10.2. Click mouse if distance short
-                        if length < 0.15 and clickFlag == 0:
-                            #  cv2.circle(img, (lineInfo[4], lineInfo[5]), 15, (0, 255, 0), cv2.FILLED)
-                            cv2.circle(img, (25, 65), 8, (100, 0, 200), cv2.FILLED)
-                            pag.mouseDown(button='middle')
-                            clickFlag = 1
-                        elif length > 0.25 and clickFlag == 1:
-                            cv2.circle(img, (25, 65), 8, (200, 0, 100), cv2.FILLED)
-                            pag.mouseUp(button='middle')
-                            clickFlag = 0
-
-                elif fingersR[1:3] == [1, 1] and not any(fingersR[3:]):
-                    cv2.putText(img, "Scrolling", (45, 50), cv2.FONT_HERSHEY_PLAIN, 1, (0, 252, 0), 2)
-                    if fingersL[1] == 1 and fingersL[2] == 1 and fingersL[3] == 0 and fingersL[4] == 0:
-                        pag.scroll(30)
-                        cv2.putText(img, "UP", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-                    elif fingersL[1] == 0 and fingersL[2] == 0 and fingersL[3] == 0 and fingersL[4] == 0:
-                        cv2.putText(img, "DOWN", (45, 70), cv2.FONT_HERSHEY_PLAIN, 1, (255, 0, 0), 2)
-                        pag.scroll(-30)
-
-                elif all(fingersR[1:]) and not fingersR[0]:
-                    pag.mouseUp(button='left')
-                    pag.mouseUp(button='right')
-                    pag.mouseUp(button='middle')
-                # cv2.rectangle(img, (frameR, frameR), (wCam - frameR, hCam - frameR), (255, 0, 255), 2)
-                
-                self.change_pixmap_signal.emit(cv_img)
-        # shut down capture system
-        cap.release()
+        # capture from web cam, or replay a file
+        cap = srm.openSource(self.frameSource, (self.wCam, self.hCam), self.sourceRealtime)
+        # read frames on their own thread so inference always gets the newest one, or every frame of a file played as fast as possible
+        # a camera keeps serving its newest frame whatever the setting, only files can wait for the loop
+        grabber = cpm.frameGrabber(cap, lossless=not self.sourceRealtime and isinstance(cap, srm.fileSource)).start()
+        # Initialize the hand detector object, input sink, screen size, and gesture engine
+        profiler = pfm.stageProfiler()
+        detector = htm.handDetector(maxHands=2, detectionCon=0.5, trackCon=0.8,
+                                    inferenceProcess=self.inferenceProcess, frameShape=(self.hCam, self.wCam, 3),
+                                    roiTracking=self.roiTracking, inferenceScale=self.inferenceScale,
+                                    keyframeInterval=self.keyframeInterval,
+                                    motionGate=mtm.motionGate() if self.motionGating else None,
+                                    mirror=self.mirrorLandmarks, profiler=profiler)
+        quality = gvm.qualityController(detector, self.targetFps) if self.targetFps else None
+        # the quality controller keeps the inference scale while idle, the governor only pauses it
+        governor = gvm.idleGovernor(detector, grabber, quality=quality) if self.idlePower else None
+        sink = ipm.inputSink(ipm.nullBackend() if self.dryRun else None).start()
+        mapper = scm.screenMapper(scm.listMonitors(sink.screenSize()), (self.wCam, self.hCam), self.frameR, self.screenMonitor)
+        corners = []
+        engine = gsm.gestureEngine()
+        smoother = flm.CURSOR_FILTERS[self.cursorFilter]()
+        predictor = flm.cursorPredictor() if self.cursorPrediction else None
+        scroller = ipm.scrollEngine(sink).start()
+        scheduler = ipm.cursorScheduler(sink, self.cursorRate).start() if self.cursorRate else None
+        overlay = None if self.headless else ovm.overlayRenderer(self.previewSize, self.previewFps, mirror=self.mirrorLandmarks)
+        try:
+            while self._run_flag:
+                profiler.start()
+                ret, seq, timestamp, cv_img = grabber.readFrame()
+                if ret:
+                    profiler.mark('capture')
+                    tStart = time.perf_counter()
+                    if not self.mirrorLandmarks:
+                        # flip in place, the frame is a pooled buffer of the grabber
+                        cv2.flip(cv_img, 1, dst=cv_img)
+                    profiler.mark('convert')
+                    img = detector.findHands(cv_img, draw=False, timestamp=timestamp, seq=seq)
+                    tInference = time.perf_counter()
+                    lmListL, lmListR = detector.findPosition(img,draw=False)
+                    if self._nextMonitor:
+                        self._nextMonitor = False
+                        mapper.nextMonitor()
+                    if self._resetScreen:
+                        self._resetScreen = False
+                        monitors = scm.listMonitors(sink.screenSize())
+                        mapper.setMonitors(monitors)
+                        sink.setMonitors(monitors)
+                        mapper.resetCalibration()
+                        corners = []
+                    # every input event from this frame is traced back to the capture of the frame its landmarks came from
+                    frame = (detector.sourceSeq, detector.sourceTime)
+                    profiler.mark('landmarks')
+                    if governor is not None:
+                        governor.update(detector.handPresent.any(), timestamp)
+
+                    # 2. Get the tip of the index
+                    if len(lmListR) != 0:
+                        x1, y1 = lmListR[8][1:] # fix this with line 56,60 in startseperate.py
+                        # print(x1, y1)
+                        if self._calibrate:
+                            # take the next calibration corner, from the top left clockwise
+                            self._calibrate = False
+                            corners.append((x1, y1))
+                            if len(corners) == len(scm.CORNER_NAMES):
+                                mapper.calibrate(corners)
+                                corners = []
+
+                    # 3. Check which fingers are up and resolve the gesture
+                    masks, ratios = detector.features.masks(), detector.features.ratios()
+                    action, events = engine.update(masks[htm.LEFT], masks[htm.RIGHT], ratios[htm.LEFT, 1])
+                    profiler.mark('gesture')
+
+                    if action in gsm.MOVING: # moving mode
+                        # 5. Convert Coordinates, from the frame size the camera actually delivers
+                        mapper.setCamera(img.shape[1::-1])
+                        x3, y3 = mapper.map(x1, y1)
+                        # print(x3, y3)
+
+                        # 6. Smoothen Values
+                        clocX, clocY = smoother.filter(x3, y3, timestamp)
+                        if predictor is not None:
+                            clocX, clocY = predictor.predict(clocX, clocY, timestamp, time.perf_counter() - timestamp)
+                        # print(clocX)
+
+                        # 7. Move Mouse through the input sink, or glide there at the output rate
+                        if scheduler is not None:
+                            scheduler.setTarget(clocX, clocY, frame=frame)
+                        else:
+                            sink.move(clocX, clocY, frame=frame)
+                        #  cv2.circle(img, (x1, y1), 15, (255, 36, 15), cv2.FILLED)
+                        self.clocX, self.clocY = clocX, clocY
+
+                    # Scroll at a velocity set by the gesture, the scroll engine sends the wheel clicks at its own tick
+                    if self.scrollMode == 'proportional' and action in (gsm.SCROLL, gsm.SCROLL_UP, gsm.SCROLL_DOWN):
+                        scroller.update(height=(self.hCam / 2 - y1) / (self.hCam / 2 - self.frameR), now=timestamp, frame=frame)
+                    else:
+                        scroller.update(1 if action == gsm.SCROLL_UP else -1 if action == gsm.SCROLL_DOWN else 0, now=timestamp, frame=frame)
+
+                    # 8. Press or release the buttons whose pinch crossed a threshold
+                    for button, down in events:
+                        if down:
+                            sink.press(button, frame=frame)
+                        else:
+                            sink.release(button, frame=frame)
+                        if overlay is not None:
+                            overlay.flash(down)
+                    # cv2.rectangle(img, (frameR, frameR), (wCam - frameR, hCam - frameR), (255, 0, 255), 2)
+                    profiler.mark('input')
+                    if quality is not None:
+                        tEnd = time.perf_counter()
+                        quality.update(tEnd - tStart, {'inference': tInference - tStart, 'control': tEnd - tInference})
+
+                    if overlay is not None and overlay.due():
+                        mode, detail = gsm.ACTION_LABELS[action]
+                        hud = []
+                        if mode:
+                            hud.append((mode, (45, 50), ovm.GREEN))
+                        if detail:
+                            hud.append((detail, (45, 70), ovm.BLUE))
+                        if self.profileHud:
+                            hud.extend((line, (20, 110 + 14 * i), ovm.BLACK) for i, line in enumerate(profiler.hud()))
+                        overlay.render(cv_img, detector.lmNorm, detector.handPresent, hud, out=self.preview.buffer())
+                        self.preview.publish()
+                        profiler.mark('display')
+                    profiler.end()
+                elif grabber.ended:
+                    # the replayed file is over
+                    break
+        except KeyboardInterrupt:
+            # Ctrl+C when running headless without the window
+            pass
+        # shut down capture system and let go of any held button
+        grabber.release()
+        detector.close()
+        for button, down in engine.releaseAll():
+            sink.release(button)
+        if scheduler is not None:
+            scheduler.stop()
+        scroller.stop()
+        sink.stop()
+        if governor is not None:
+            print("idle governor:", governor.report())
+        if quality is not None:
+            print("quality:", quality.report())
+        print("features:", detector.features.report())
+        print("stages p50/p95:", profiler.report())
+        if self.profileDump:
+            profiler.dump(self.profileDump)
+        print("input latency p50/p95/p99:", sink.traceReport())
+        if self.traceDump:
+            sink.dumpTrace(self.traceDump)
+        print("preview:", self.preview.report())
+        if predictor is not None:
+            print(f"cursor prediction removed {100 * predictor.errorReduction():.0f}% of the error")
+
+    def calibrate(self):
+        """Takes the right index tip of the next frame as the next screen corner"""
+        self._calibrate = True
+
+    def nextMonitor(self):
+        """Maps the hand onto the next monitor, then onto all of them"""
+        self._nextMonitor = True
+
+    def resetScreen(self):
+        """Rereads the monitor layout and drops the calibration"""
+        self._resetScreen = True
 
     def stop(self):
         """Sets run flag to False and waits for thread to finish"""
@@ -172,31 +252,53 @@ class App(QWidget):
 
         # create the video capture thread
         self.thread = VideoThread()
-        # connect its signal to the update_image slot
-        self.thread.change_pixmap_signal.connect(self.update_image)
+        # poll for the latest preview, a slow GUI skips previews instead of queueing them
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_image)
+        self.timer.start(1000 // (2 * self.thread.previewFps))
         # start the thread
         self.thread.start()
 
+    def keyPressEvent(self, event):
+        # press C with the index tip on each screen corner in turn to calibrate
+        if event.key() == Qt.Key_C:
+            self.thread.calibrate()
+        # M for the next monitor, R to reread the monitors after plugging one in and drop the calibration
+        elif event.key() == Qt.Key_M:
+            self.thread.nextMonitor()
+        elif event.key() == Qt.Key_R:
+            self.thread.resetScreen()
+
     def closeEvent(self, event):
+        self.timer.stop()
         self.thread.stop()
         event.accept()
 
-    @pyqtSlot(np.ndarray)
-    def update_image(self, cv_img):
-        """Updates the image_label with a new opencv image"""
-        qt_img = self.convert_cv_qt(cv_img)
-        self.image_label.setPixmap(qt_img)
-    
+    @pyqtSlot()
+    def update_image(self):
+        """Updates the image_label with the latest preview, if there is a new one"""
+        cv_img = self.thread.preview.take()
+        if cv_img is not None:
+            self.image_label.setPixmap(self.convert_cv_qt(cv_img))
+
     def convert_cv_qt(self, cv_img):
         """Convert from an opencv image to QPixmap"""
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
+        h, w, ch = cv_img.shape
         bytes_per_line = ch * w
-        convert_to_Qt_format = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-        p = convert_to_Qt_format.scaled(self.disply_width, self.display_height, Qt.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+        # wraps the BGR buffer as is, the pixmap is the only copy
+        convert_to_Qt_format = QtGui.QImage(cv_img.data, w, h, bytes_per_line, QtGui.QImage.Format_BGR888)
+        if (w, h) != (self.disply_width, self.display_height):
+            convert_to_Qt_format = convert_to_Qt_format.scaled(self.disply_width, self.display_height, Qt.KeepAspectRatio)
+        return QPixmap.fromImage(convert_to_Qt_format)
     
 if __name__=="__main__":
+    # python main.py [--headless]
+    if '--headless' in sys.argv:
+        # no QApplication and no window, so no display is needed, run the loop on this thread
+        thread = VideoThread()
+        thread.headless = True
+        thread.run()
+        sys.exit()
     app = QApplication(sys.argv)
     a = App()
     a.show()